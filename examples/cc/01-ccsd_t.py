@@ -0,0 +1,21 @@
+import jax
+from pyscfad import gto, scf, cc
+
+mol = gto.Mole()
+mol.atom = 'H 0. 0. 0.; F 0. 0. 1.1'
+mol.basis = 'ccpvdz'
+mol.verbose = 4
+mol.incore_anyway = True
+mol.build()
+
+def ccsd_t(mol):
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mycc = cc.RCCSD(mf)
+    eris = mycc.ao2mo()
+    mycc.kernel(eris=eris)
+    et = mycc.ccsd_t(eris=eris)
+    return mycc.e_tot + et
+
+jac = jax.jacrev(ccsd_t)(mol)
+print(jac.coords)
@@ -0,0 +1,17 @@
+from pyscfad import gto, scf
+from pyscfad.scf import newton
+
+"""
+Trust-region Newton SCF with orbital Hessian-vector products computed by AD
+"""
+
+mol = gto.Mole()
+mol.atom = 'H 0 0 0; F 0 0 1.1'
+mol.basis = 'ccpvdz'
+mol.verbose = 4
+mol.build()
+
+mf = scf.RHF(mol)
+e = newton.kernel(mf)
+jac = mf.energy_grad()
+print(jac.coords)
@@ -1 +1,2 @@
 from . import incore
+from . import outcore
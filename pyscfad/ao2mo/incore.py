@@ -1,14 +1,137 @@
+from functools import lru_cache
+import numpy
+import jax
+from jax import core
+from pyscf.lib import logger, param, prange
 from pyscfad.lib import numpy as jnp
 
 def full(eri_ao, mo_coeff, verbose=0, compact=True, **kwargs):
-    return general(eri_ao, (mo_coeff,)*4, verbose, compact)
+    return general(eri_ao, (mo_coeff,)*4, verbose, compact, **kwargs)
 
-def general(eri_ao, mo_coeffs, verbose=0, compact=True, **kwargs):
-    nao = mo_coeffs[0].shape[0]
+def general(eri_ao, mo_coeffs, verbose=0, compact=True,
+            max_memory=param.MAX_MEMORY, **kwargs):
+    '''
+    (ij|kl) = sum_pqrs (pq|rs) C1_pi^* C2_qj C3_rk^* C4_sl
 
+    The AO integrals can be given without symmetry (nao**4 elements),
+    or packed with 4-fold (npair, npair) or 8-fold symmetry.
+    The transformation is done one index at a time, with the (pq| pairs
+    streamed in blocks that fit in ``max_memory`` (MB).
+    The MO coefficients of the four indices can be different.
+    The result is always returned as the 4-index tensor.
+    '''
+    nao = mo_coeffs[0].shape[0]
+    npair = nao * (nao+1) // 2
     if eri_ao.size == nao**4:
-        return jnp.einsum('pqrs,pi,qj,rk,sl->ijkl', eri_ao.reshape([nao]*4),
-                          mo_coeffs[0].conj(), mo_coeffs[1],
-                          mo_coeffs[2].conj(), mo_coeffs[3])
+        aosym = 's1'
+        nrow = nao**2
+    elif eri_ao.size == npair**2:
+        aosym = 's4'
+        nrow = npair
+    elif eri_ao.size == npair*(npair+1)//2:
+        aosym = 's8'
+        nrow = npair
+    else:
+        raise ValueError('eri_ao of size %d does not match nao = %d' %
+                         (eri_ao.size, nao))
+
+    c1 = mo_coeffs[0].conj()
+    c2 = mo_coeffs[1]
+    c3 = mo_coeffs[2].conj()
+    c4 = mo_coeffs[3]
+    nk = c3.shape[1]
+    nl = c4.shape[1]
+    # one block of unpacked (pq|rs) rows and its half-transformed (pq|kl)
+    blksize = max_memory*1e6/8 / (nao**2 + nk*nl + nao*nl)
+    blksize = int(min(nrow, max(1, blksize)))
+
+    # (pq|kl)
+    eri_half = []
+    for p0, p1 in prange(0, nrow, blksize):
+        buf = _unpack_rows(eri_ao, aosym, nao, p0, p1)
+        # transform the index with the smaller MO space first
+        if nk <= nl:
+            buf = jnp.einsum('xrs,rk->xks', buf, c3)
+            eri_half.append(jnp.einsum('xks,sl->xkl', buf, c4))
+        else:
+            buf = jnp.einsum('xrs,sl->xrl', buf, c4)
+            eri_half.append(jnp.einsum('xrl,rk->xkl', buf, c3))
+    buf = None
+    eri_half = jnp.concatenate(eri_half, axis=0)
+
+    if aosym != 's1':
+        idx = _tril_index(nao)
+        eri_half = eri_half[idx]
+    eri_half = eri_half.reshape(nao, nao, nk, nl)
+    if c1.shape[1] <= c2.shape[1]:
+        eri_half = jnp.einsum('pqkl,pi->iqkl', eri_half, c1)
+        return jnp.einsum('iqkl,qj->ijkl', eri_half, c2)
+    else:
+        eri_half = jnp.einsum('pqkl,qj->pjkl', eri_half, c2)
+        return jnp.einsum('pjkl,pi->ijkl', eri_half, c1)
+
+def general_df(cderi, mo_coeffs):
+    '''
+    3-index MO integrals (ij|L) = sum_pq C1_pi^* C2_qj (pq|L)
+
+    Args:
+        cderi : (naux, nao, nao) or (naux, npair) packed Cholesky vectors
+        mo_coeffs : the MO coefficients of the two indices
+
+    Returns:
+        (n1, n2, naux) array
+    '''
+    nao = mo_coeffs[0].shape[0]
+    naux = cderi.shape[0]
+    if cderi.size == naux * nao**2:
+        cderi = cderi.reshape(naux, nao, nao)
+    else:
+        cderi = cderi[:,_tril_index(nao)]
+    c1 = mo_coeffs[0].conj()
+    c2 = mo_coeffs[1]
+    if c1.shape[1] <= c2.shape[1]:
+        tmp = jnp.einsum('Lpq,pi->iqL', cderi, c1)
+        return jnp.einsum('iqL,qj->ijL', tmp, c2)
     else:
-        raise NotImplementedError
+        tmp = jnp.einsum('Lpq,qj->pjL', cderi, c2)
+        return jnp.einsum('pjL,pi->ijL', tmp, c1)
+
+def get_cderi(with_df, mol=None):
+    '''
+    The packed AO Cholesky vectors (naux, npair) of ``with_df``.
+
+    NOTE they are computed by PySCF, and have no derivatives with respect
+    to the molecular parameters (e.g., the nuclear coordinates).
+    '''
+    if mol is not None and any(isinstance(x, core.Tracer)
+                               for x in jax.tree_util.tree_leaves(mol)):
+        logger.warn(mol, 'The density fitted 3-center integrals have no '
+                    'derivatives with respect to the molecular parameters. '
+                    'The derivatives through them are missing.')
+    return jnp.vstack(list(with_df.loop()))
+
+@lru_cache(maxsize=8)
+def _tril_index(nao):
+    # position of the pair (p,q) in the packed lower triangle
+    p = numpy.arange(nao)
+    row = numpy.maximum(p[:,None], p[None,:])
+    col = numpy.minimum(p[:,None], p[None,:])
+    return row*(row+1)//2 + col
+
+def _unpack_rows(eri_ao, aosym, nao, p0, p1):
+    '''
+    Rows p0:p1 of (pq|rs), returned as (p1-p0, nao, nao)
+    '''
+    if aosym == 's1':
+        return eri_ao.reshape(nao**2, nao, nao)[p0:p1]
+
+    idx = _tril_index(nao)
+    if aosym == 's4':
+        rows = eri_ao.reshape(-1, nao*(nao+1)//2)[p0:p1]
+        return rows[:,idx]
+
+    # s8: (PQ) with P >= Q packed as P*(P+1)//2+Q
+    pair = numpy.arange(p0, p1)[:,None,None]
+    row = numpy.maximum(pair, idx)
+    col = numpy.minimum(pair, idx)
+    return eri_ao.ravel()[row*(row+1)//2 + col]
@@ -0,0 +1,99 @@
+'''
+AO to MO transformation without the full AO integrals in memory.
+
+The AO integrals are computed by PySCF for blocks of shells of the first
+index, and have no derivatives with respect to the molecular parameters.
+'''
+import numpy
+import jax
+from pyscf import gto as pyscf_gto
+from pyscf import lib as pyscf_lib
+from pyscf.lib import param
+from pyscf.ao2mo.outcore import balance_partition
+
+def general(mol, mo_coeffs, max_memory=param.MAX_MEMORY):
+    '''
+    (ij|kl) = sum_pqrs (pq|rs) C1_pi^* C2_qj C3_rk^* C4_sl
+
+    The integrals (pq|rs) are generated for blocks of shells of p
+    that fit in ``max_memory`` (MB), and only one block is held at a time.
+    The result is returned as the 4-index numpy array.
+    '''
+    c1 = numpy.asarray(mo_coeffs[0]).conj()
+    c2 = numpy.asarray(mo_coeffs[1])
+    c3 = numpy.asarray(mo_coeffs[2]).conj()
+    c4 = numpy.asarray(mo_coeffs[3])
+    nao = mol.nao
+    npair = nao * (nao+1) // 2
+    nk = c3.shape[1]
+    nl = c4.shape[1]
+    # (pq|rs) packed and unpacked in rs, and the half-transformed (pq|kl)
+    blksize = max_memory*1e6/8 / (nao * (npair + 2*nao**2 + nk*nl))
+    blksize = int(max(1, blksize))
+
+    out = numpy.zeros((c1.shape[1], c2.shape[1], nk, nl),
+                      dtype=numpy.result_type(c1, c2, c3, c4))
+    for sh0, sh1, p0, p1 in shell_blocks(mol, blksize):
+        buf = get_s1_block(mol, sh0, sh1).reshape(-1, nao, nao)
+        buf = pyscf_lib.einsum('xrs,rk,sl->xkl', buf, c3, c4)
+        buf = buf.reshape(p1-p0, nao, nk, nl)
+        out += pyscf_lib.einsum('pqkl,pi,qj->ijkl', buf, c1[p0:p1], c2)
+        buf = None
+    return out
+
+def shell_blocks(mol, blksize):
+    '''
+    Shell ranges (sh0, sh1) and the AO ranges (p0, p1) of at most
+    ``blksize`` AOs each (but at least one shell).
+    '''
+    ao_loc = mol.ao_loc_nr()
+    return [(sh0, sh1, int(ao_loc[sh0]), int(ao_loc[sh1]))
+            for sh0, sh1, _ in balance_partition(ao_loc, blksize)]
+
+def get_s1_block(mol, sh0, sh1, intor='int2e', comp=1):
+    '''
+    (pq|rs) for p in the shells sh0:sh1, as a (p1-p0, nao, nao, nao) array,
+    or (comp, p1-p0, nao, nao, nao) for comp > 1
+    '''
+    nao = mol.nao
+    nbas = mol.nbas
+    eri = pyscf_gto.Mole.intor(mol, intor, comp=comp, aosym='s2kl',
+                               shls_slice=(sh0, sh1, 0, nbas, 0, nbas, 0, nbas))
+    eri = pyscf_lib.unpack_tril(eri.reshape(-1, nao*(nao+1)//2))
+    if comp == 1:
+        return eri.reshape(-1, nao, nao, nao)
+    return eri.reshape(comp, -1, nao, nao, nao)
+
+class AOBlocks:
+    '''
+    The AO integrals eri[p0:p1] (s1) for blocks of shells of p, computed
+    on demand so that the nao**4 tensor is never held.
+    The blocks are generated by a callback, which also works inside jit;
+    the object can be a static argument (hashed by identity).
+    NOTE the blocks have no derivatives wrt the molecular parameters.
+
+    Args:
+        blksize : int
+            The maximum number of AOs of p in a block.
+        intor : str
+            A 2-electron integral with the (pq|rs) symmetry of ``int2e``
+            in the last two indices, e.g., ``int2e_ip1``.
+    '''
+    def __init__(self, mol, blksize, intor='int2e', comp=1):
+        self.mol = mol
+        self.intor = intor
+        self.comp = comp
+        self.blocks = shell_blocks(mol, blksize)
+
+    def get_block(self, sh0, sh1, p0, p1):
+        nao = self.mol.nao
+        shape = (p1-p0, nao, nao, nao)
+        if self.comp > 1:
+            shape = (self.comp,) + shape
+        return jax.pure_callback(
+                lambda: get_s1_block(self.mol, sh0, sh1, self.intor, self.comp),
+                jax.ShapeDtypeStruct(shape, numpy.double))
+
+    def __iter__(self):
+        for sh0, sh1, p0, p1 in self.blocks:
+            yield p0, p1, self.get_block(sh0, sh1, p0, p1)
@@ -0,0 +1,37 @@
+import pytest
+import numpy
+import pyscf
+from pyscf import ao2mo as pyscf_ao2mo
+from pyscfad.ao2mo import incore
+
+@pytest.fixture
+def get_mol0():
+    mol = pyscf.M(
+        atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587',
+        basis = '631g',
+        verbose=0,
+    )
+    return mol
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize('aosym', ['s1', 's4', 's8'])
+@pytest.mark.parametrize('max_memory', [4000, 1e-3])
+def test_general(get_mol0, aosym, max_memory):
+    mol = get_mol0
+    nao = mol.nao
+    numpy.random.seed(2)
+    mo_coeffs = [numpy.random.random((nao, n)) for n in (3, 5, 4, 6)]
+    eri_ao = mol.intor('int2e', aosym=aosym)
+
+    eri = incore.general(eri_ao, mo_coeffs, max_memory=max_memory)
+    eri0 = pyscf_ao2mo.general(mol, mo_coeffs, compact=False)
+    assert abs(eri - eri0.reshape(3, 5, 4, 6)).max() < 1e-10
+
+def test_full(get_mol0):
+    mol = get_mol0
+    nao = mol.nao
+    numpy.random.seed(3)
+    mo_coeff = numpy.random.random((nao, nao))
+    eri = incore.full(mol.intor('int2e', aosym='s8'), mo_coeff)
+    eri0 = pyscf_ao2mo.full(mol, mo_coeff, compact=False)
+    assert abs(eri - eri0.reshape((nao,)*4)).max() < 1e-10
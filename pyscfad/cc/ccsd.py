@@ -1,5 +1,10 @@
 from typing import Optional, Any
-from functools import reduce
+from functools import reduce, partial, lru_cache
+from collections import OrderedDict
+import copy
+import numpy
+import jax
+from jax.scipy.sparse.linalg import gmres
 from pyscf import __config__
 from pyscf.cc import ccsd
 from pyscf.mp.mp2 import _mo_without_core
@@ -8,23 +13,139 @@ from pyscfad.lib import numpy as jnp
 from pyscfad.gto import mole
 from pyscfad.scf import hf
 
+@lru_cache(maxsize=16)
+def _t2_index(nocc, nvir):
+    '''
+    Index maps between t2[i,j,a,b] and the packed lower triangle of
+    t2 viewed as a (nov, nov) matrix of (ia, jb), cached per (nocc, nvir).
+    The packed form is only used for the amplitude vectors (e.g., the DIIS
+    history of the compiled RCCSD kernel); the intermediates consume
+    the unpacked t2.
+
+    Returns:
+        pack : indices into t2.ravel() of the packed elements
+        unpack : indices into the packed vector of each t2 element
+    '''
+    nov = nocc * nvir
+    row, col = numpy.tril_indices(nov)
+    i, a = divmod(row, nvir)
+    j, b = divmod(col, nvir)
+    pack = ((i*nocc + j)*nvir + a)*nvir + b
+
+    ia = numpy.arange(nov).reshape(nocc,nvir)
+    p = ia[:,None,:,None]
+    q = ia[None,:,None,:]
+    row = numpy.maximum(p, q)
+    col = numpy.minimum(p, q)
+    unpack = row*(row+1)//2 + col
+    return pack, unpack
+
 def amplitudes_to_vector(t1, t2, out=None):
     nocc, nvir = t1.shape
-    nov = nocc * nvir
-    vector_t1 = t1.ravel()
-    vector_t2 = t2.transpose(0,2,1,3).reshape(nov,nov)[jnp.tril_indices(nov)]
-    vector = jnp.concatenate((vector_t1, vector_t2), axis=None)
+    pack = _t2_index(nocc, nvir)[0]
+    vector_t2 = t2.ravel()[pack]
+    vector = jnp.concatenate((t1.ravel(), vector_t2), axis=None)
     return vector
 
 def vector_to_amplitudes(vector, nmo, nocc):
     nvir = nmo - nocc
     nov = nocc * nvir
     t1 = vector[:nov].reshape((nocc,nvir))
-    # filltriu=lib.SYMMETRIC because t2[iajb] == t2[jbia]
-    t2 = lib.unpack_tril(vector[nov:], filltriu=lib.SYMMETRIC)
-    t2 = t2.reshape(nocc,nvir,nocc,nvir).transpose(0,2,1,3)
+    # t2[iajb] == t2[jbia], a single gather from the packed vector
+    unpack = _t2_index(nocc, nvir)[1]
+    t2 = vector[nov:][unpack]
     return t1, t2
 
+# ERI blocks (and orbitals) that the amplitude equations depend on
+_ERIS_KEYS = ('fock', 'mo_energy', 'mo_coeff', 'oooo', 'ovoo', 'ovov',
+              'oovv', 'ovvo', 'ovvv', 'vvvv', 'eri_ao', 'ooL', 'ovL', 'vvL')
+
+def _is_array(x):
+    return isinstance(x, (numpy.ndarray, jnp.ndarray))
+
+def _eris_to_params(eris):
+    '''
+    The in-memory integrals of eris. Blocks stored on disk
+    (e.g., the HDF5 ovvv) are not included.
+    '''
+    params = {}
+    for key in _ERIS_KEYS:
+        val = getattr(eris, key, None)
+        if _is_array(val):
+            params[key] = val
+    return params
+
+def _params_to_eris(eris, params):
+    eris = copy.copy(eris)
+    for key, val in params.items():
+        setattr(eris, key, val)
+    # so that update_amps does not rebuild the params
+    eris._params = params
+    return eris
+
+@partial(jax.custom_vjp, nondiff_argnums=(0,1,2))
+def _fixed_point(solve, update, adjoint, params):
+    return solve(params)
+
+def _fixed_point_fwd(solve, update, adjoint, params):
+    t = solve(params)
+    return t, (params, t)
+
+def _fixed_point_bwd(solve, update, adjoint, res, t_bar):
+    params, t = res
+    _, vjp_t = jax.vjp(lambda t: update(params, t), t)
+    w = adjoint(vjp_t, t_bar)
+    _, vjp_params = jax.vjp(lambda params: update(params, t), params)
+    return vjp_params(w)
+
+_fixed_point.defvjp(_fixed_point_fwd, _fixed_point_bwd)
+
+def solve_adjoint(mycc, vjp_t, t_bar):
+    '''
+    Solve the adjoint amplitude equations (1 - dG/dt)^T w = t_bar,
+    where G is the (Jacobi) amplitude update of :meth:`update_amps`.
+    Up to the orbital energy denominators, these are the CCSD Lambda
+    equations with t_bar as the inhomogeneous term.
+    '''
+    def matvec(w):
+        jtw = vjp_t(w)[0]
+        return jax.tree_util.tree_map(lambda x, y: x - y, w, jtw)
+    # GMRES rather than DIIS so that the solve also works
+    # for the batched cotangents of jacrev
+    w, _ = gmres(matvec, t_bar, x0=t_bar, tol=mycc.conv_tol_normt,
+                 maxiter=mycc.max_cycle)
+    return w
+
+def solve_amplitudes(mycc, eris, t1=None, t2=None, kernel=ccsd.kernel,
+                     params=None):
+    '''
+    Converged CCSD amplitudes, differentiated implicitly.
+
+    The amplitudes are solved (with DIIS) by ``kernel`` outside of the AD
+    trace and registered as the fixed point of :meth:`update_amps`.
+    In the backward pass the adjoint (Lambda-like) equations are solved once,
+    instead of back-propagating through every iteration.
+    Being a ``custom_vjp``, the result cannot be differentiated in forward
+    mode (``jvp``, ``jacfwd``, and hence hessians).
+    ``params`` are the integrals the amplitudes are differentiated against
+    (default ``_eris_to_params(eris)``).
+    '''
+    def update(params, t):
+        return mycc.update_amps(*t, _params_to_eris(eris, params))
+
+    def solve(params):
+        conv, _, t1_, t2_ = kernel(mycc, _params_to_eris(eris, params), t1, t2,
+                                   max_cycle=mycc.max_cycle,
+                                   tol=mycc.conv_tol,
+                                   tolnormt=mycc.conv_tol_normt,
+                                   verbose=mycc.verbose)
+        mycc.converged = conv
+        return t1_, t2_
+
+    if params is None:
+        params = _eris_to_params(eris)
+    return _fixed_point(solve, update, partial(solve_adjoint, mycc), params)
+
 @lib.dataclass
 class CCSD(ccsd.CCSD):
     _scf: hf.SCF = lib.field(pytree_node=True)
@@ -67,6 +188,12 @@ class CCSD(ccsd.CCSD):
     async_io: bool = getattr(__config__, 'cc_ccsd_CCSD_async_io', True)
     incore_complete: bool = getattr(__config__, 'cc_ccsd_CCSD_incore_complete', False)
     cc2: bool = getattr(__config__, 'cc_ccsd_CCSD_cc2', False)
+    # differentiate the converged amplitudes implicitly.
+    # NOTE this is a custom_vjp, which supports reverse mode only;
+    # set it to False for jacfwd, jvp and hessians of the CCSD energy
+    implicit_diff: bool = getattr(__config__, 'cc_ccsd_CCSD_implicit_diff', True)
+    # EOM intermediates, see eom_rccsd._get_imds
+    _eom_imds: OrderedDict = lib.field(default_factory=OrderedDict, signature=False)
 
     def __post_init__(self):
         if self.mo_coeff is None:
@@ -97,6 +224,13 @@ class CCSD(ccsd.CCSD):
         if nmo is None: nmo = self.nmo
         return vector_to_amplitudes(vec, nmo, nocc)
 
+    def ccsd_t(self, t1=None, t2=None, eris=None):
+        from pyscfad.cc import ccsd_t
+        if t1 is None: t1 = self.t1
+        if t2 is None: t2 = self.t2
+        if eris is None: eris = self.ao2mo(self.mo_coeff)
+        return ccsd_t.kernel(self, eris, t1, t2, self.verbose)
+
     def ipccsd(self, nroots=1, left=False, koopmans=False, guess=None,
                partition=None, eris=None):
         from pyscfad.cc import eom_rccsd
@@ -126,6 +260,7 @@ class _ChemistsERIs(ccsd._ChemistsERIs):
         self.e_hf = mycc._scf.energy_tot(dm=dm, vhf=vhf)
         nocc = self.nocc = mycc.nocc
         self.mol = mycc.mol
+        self.max_memory = mycc.max_memory
 
         mo_e = self.mo_energy = self.fock.diagonal().real
         """
@@ -0,0 +1,99 @@
+'''
+CCSD(T) for RHF-CCSD
+
+The triples are evaluated in blocks of virtual triplets a >= b >= c.
+Each block is checkpointed, so that reverse-mode AD recomputes
+the (block, nocc, nocc, nocc) W and V tensors instead of storing
+the whole o^3 v^3 triples.
+'''
+from functools import lru_cache
+import numpy
+import jax
+from pyscf.lib import logger, current_memory, prange
+from pyscfad.lib import numpy as jnp
+
+@lru_cache(maxsize=8)
+def _triplets(nvir):
+    '''
+    Virtual triplets a >= b >= c and the weights
+    from the permutational symmetry.
+    '''
+    a, b, c = numpy.array([(a, b, c) for a in range(nvir)
+                                     for b in range(a+1)
+                                     for c in range(b+1)]).reshape(-1,3).T
+    fac = numpy.ones(a.size)
+    fac[(a == b) | (b == c)] = 2.
+    fac[a == c] = 6.
+    return a, b, c, fac
+
+def r3(w):
+    return (4 * w + w.transpose(0,2,3,1) + w.transpose(0,3,1,2)
+            - 2 * w.transpose(0,3,2,1) - 2 * w.transpose(0,1,3,2)
+            - 2 * w.transpose(0,2,1,3))
+
+def _permute(fn, a, b, c):
+    # sum over the 6 permutations of (a,b,c) with the occupied indices
+    # permuted accordingly
+    return (fn(a, b, c) + fn(a, c, b).transpose(0,1,3,2) +
+            fn(b, a, c).transpose(0,2,1,3) + fn(b, c, a).transpose(0,3,1,2) +
+            fn(c, a, b).transpose(0,2,3,1) + fn(c, b, a).transpose(0,3,2,1))
+
+@jax.checkpoint
+def _block_energy(a, b, c, fac, t1T, t2T, eris_vvov, eris_vooo, eris_vvoo,
+                  fvo, e_occ, e_vir):
+    def get_w(a, b, c):
+        w = jnp.einsum('nif,nfkj->nijk', eris_vvov[a,b], t2T[c])
+        w-= jnp.einsum('nijm,nmk->nijk', eris_vooo[a], t2T[b,c])
+        return w
+    def get_v(a, b, c):
+        v = jnp.einsum('nij,nk->nijk', eris_vvoo[a,b], t1T[c]*.5)
+        v+= jnp.einsum('nij,nk->nijk', t2T[a,b], fvo[c]*.5)
+        return v
+
+    eijk = (e_occ[:,None,None] + e_occ[None,:,None] + e_occ[None,None,:])
+    d3 = eijk[None] - (e_vir[a] + e_vir[b] + e_vir[c])[:,None,None,None]
+    d3 = d3 * fac[:,None,None,None]
+
+    wabc = _permute(get_w, a, b, c)
+    vabc = _permute(get_v, a, b, c)
+    zabc = r3(wabc + vabc) / d3
+    return jnp.einsum('nijk,nijk', wabc, zabc.conj())
+
+def kernel(mycc, eris, t1=None, t2=None, verbose=logger.NOTE):
+    if isinstance(verbose, logger.Logger):
+        log = verbose
+    else:
+        log = logger.Logger(mycc.stdout, verbose)
+    cput0 = (logger.process_clock(), logger.perf_counter())
+
+    if t1 is None: t1 = mycc.t1
+    if t2 is None: t2 = mycc.t2
+
+    t1T = t1.T
+    t2T = t2.transpose(2,3,0,1)
+
+    nvir, nocc = t1T.shape
+    mo_e = eris.fock.diagonal().real
+    e_occ, e_vir = mo_e[:nocc], mo_e[nocc:]
+
+    eris_vvov = eris.get_ovvv().conj().transpose(1,3,0,2)
+    eris_vooo = jnp.asarray(eris.ovoo).conj().transpose(1,0,3,2)
+    eris_vvoo = jnp.asarray(eris.ovov).conj().transpose(1,3,0,2)
+    fvo = eris.fock[nocc:,:nocc]
+
+    a, b, c, fac = _triplets(nvir)
+    # W, V, Z and the intermediates of each block
+    max_memory = max(0, mycc.max_memory - current_memory()[0])
+    blksize = int(min(a.size, max(1, max_memory*1e6/8/(8*nocc**3))))
+    log.debug1('max_memory %d MB, nocc,nvir = %d,%d, blksize = %d',
+               max_memory, nocc, nvir, blksize)
+
+    et = 0
+    for p0, p1 in prange(0, a.size, blksize):
+        et += _block_energy(a[p0:p1], b[p0:p1], c[p0:p1], fac[p0:p1],
+                            t1T, t2T, eris_vvov, eris_vooo, eris_vvoo,
+                            fvo, e_occ, e_vir)
+    et *= 2
+    log.timer('CCSD(T)', *cput0)
+    log.note('CCSD(T) correction = %.15g', et)
+    return et
@@ -1,10 +1,16 @@
 from typing import Optional, Any
+import numpy
+import jax
+from jax import core
 from pyscf import __config__
+from pyscf.lib import logger
 from pyscf.cc import eom_rccsd as pyscf_eom_rccsd
 from pyscfad import lib
 from pyscfad.lib import numpy as np
+from pyscfad.lib import stop_grad
 from pyscfad import gto
 from pyscfad.cc import ccsd
+from pyscfad.cc import rintermediates as imd
 
 
 @lib.dataclass
@@ -45,6 +51,151 @@ class EOM(pyscf_eom_rccsd.EOM):
         
         self._keys = set(self.__dict__.keys())
 
+def davidson_nosym(aop, x0, diag, tol=1e-7, max_cycle=50, max_space=20,
+                   tol_residual=None, verbose=logger.WARN):
+    '''
+    Block Davidson solver for the lowest right eigenvectors
+    of a non-symmetric matrix.
+
+    Args:
+        aop : callable
+            Batched matrix-vector product, (m, n) -> (m, n).
+        x0 : (nroots, n) array
+            Initial guess.
+        diag : (n,) array
+            Diagonal of the matrix, used as the preconditioner.
+
+    Returns:
+        conv : list of bool
+        e : (nroots,) array
+        x : (nroots, n) array
+    '''
+    log = logger.new_logger(verbose=verbose) if isinstance(verbose, int) else verbose
+    if tol_residual is None:
+        tol_residual = numpy.sqrt(tol)
+    x0 = np.asarray(x0)
+    nroots = x0.shape[0]
+    max_space = max(max_space, 2*nroots)
+
+    def orthonormalize(v, basis):
+        out = []
+        for vi in v:
+            if basis is not None:
+                vi -= np.dot(np.dot(basis.conj(), vi), basis)
+            for vj in out:
+                vi -= np.dot(vj.conj(), vi) * vj
+            norm = np.linalg.norm(vi)
+            if norm > 1e-8:
+                out.append(vi / norm)
+        return out
+
+    basis = np.asarray(orthonormalize(x0, None))
+    abasis = aop(basis)
+    e = None
+    conv = [False] * nroots
+    for icyc in range(max_cycle):
+        h = np.dot(basis.conj(), abasis.T)
+        w, c = numpy.linalg.eig(numpy.asarray(h))
+        # the lowest eigenvalues, preferring the real ones
+        idx = numpy.lexsort((w.real, abs(w.imag) > 1e-3 * (1 + abs(w.real))))
+        idx = idx[:nroots]
+        w = w[idx].real
+        c = c[:,idx].real
+        x = np.dot(c.T, basis)
+        ax = np.dot(c.T, abasis)
+        r = ax - w[:,None] * x
+        rnorm = np.linalg.norm(r, axis=1)
+        de = w - e if e is not None else w
+        e = w
+        conv = [bool(abs(de[k]) < tol and rnorm[k] < tol_residual)
+                for k in range(nroots)]
+        log.debug('davidson %d  |r|= %s  e= %s', icyc, rnorm, e)
+        if all(conv):
+            break
+
+        denom = w[:,None] - diag[None,:]
+        denom = np.where(abs(denom) < 1e-8, 1e-8, denom)
+        dx = [r[k] / denom[k] for k in range(nroots) if not conv[k]]
+        if basis.shape[0] + len(dx) > max_space:
+            # collapse the subspace to the current eigenvectors
+            basis = np.asarray(orthonormalize(x, None))
+            abasis = aop(basis)
+        dx = orthonormalize(dx, basis)
+        if not dx:
+            break
+        dx = np.asarray(dx)
+        basis = np.vstack((basis, dx))
+        abasis = np.vstack((abasis, aop(dx)))
+    return conv, e, x
+
+def kernel(eom, nroots=1, left=False, koopmans=False, guess=None,
+           partition=None, eris=None, imds=None):
+    '''
+    EOM-CCSD eigenvalues from a batched Davidson solver.
+
+    The matvec is applied to all the trial vectors of one iteration at once
+    through ``jax.vmap``, reusing the same intermediates.
+    If the intermediates are traced, the left eigenvectors are solved as well
+    and the eigenvalues are returned as l.H.r / l.r, whose derivatives
+    follow from the (fixed) left and right eigenvectors.
+    '''
+    cput0 = (logger.process_clock(), logger.perf_counter())
+    log = logger.new_logger(eom)
+    eom.dump_flags()
+    if partition:
+        eom.partition = partition.lower()
+        assert eom.partition in ['mp','full']
+    if imds is None:
+        imds = eom.make_imds(eris)
+
+    size = eom.vector_size()
+    nroots = min(nroots, size)
+    # the diagonal is cached along with the intermediates
+    diag = getattr(imds, 'diag', None)
+    if diag is None:
+        diag = imds.diag = eom.get_diag(imds)
+    if guess is not None:
+        x0 = np.asarray([np.asarray(g) for g in guess])
+    else:
+        x0 = np.asarray(eom.get_init_guess(nroots, koopmans, diag))
+
+    matvec = lambda x: eom.matvec(x, imds, diag)
+    def aop(x):
+        return jax.vmap(matvec)(x)
+    def aop_left(x):
+        # l.H, the transpose of the (linear) matvec
+        _, vjp = jax.vjp(matvec, np.zeros_like(x[0]))
+        return jax.vmap(lambda v: vjp(v)[0])(x)
+
+    diag0 = stop_grad(diag)
+    def solve(op):
+        return davidson_nosym(lambda x: stop_grad(op(x)), stop_grad(x0), diag0,
+                              tol=eom.conv_tol, max_cycle=eom.max_cycle,
+                              max_space=eom.max_space, verbose=log)
+
+    traced = isinstance(diag, core.Tracer)
+    if left:
+        conv, e, v = solve(aop_left)
+    else:
+        conv, e, v = solve(aop)
+    if traced:
+        if left:
+            l = v
+            r = solve(aop)[2]
+        else:
+            r = v
+            l = solve(aop_left)[2]
+        e = np.einsum('ni,ni->n', l, aop(r)) / np.einsum('ni,ni->n', l, r)
+
+    for n, en in enumerate(e):
+        log.info('%s root %d E = %.16g  conv = %s', eom.__class__.__name__,
+                 n, en, conv[n])
+    log.timer('EOM-CCSD', *cput0)
+    eom.converged, eom.e, eom.v = conv, e, v
+    if nroots == 1:
+        eom.converged, eom.e, eom.v = conv[0], e[0], v[0]
+    return eom.e, eom.v
+
 def ipccsd_diag(eom, imds=None):
     if imds is None: imds = eom.make_imds()
     t1, t2 = imds.t1, imds.t2
@@ -123,12 +274,279 @@ def ipccsd_matvec(eom, vector, imds=None, diag=None):
     vector = eom.amplitudes_to_vector(Hr1, Hr2)
     return vector
 
+def vector_to_amplitudes_ip(vector, nmo, nocc):
+    nvir = nmo - nocc
+    r1 = vector[:nocc]
+    r2 = vector[nocc:].reshape(nocc,nocc,nvir)
+    return r1, r2
+
+def amplitudes_to_vector_ip(r1, r2):
+    return np.concatenate((r1, r2.ravel()))
+
+def eaccsd_diag(eom, imds=None):
+    if imds is None: imds = eom.make_imds()
+    t1, t2 = imds.t1, imds.t2
+    nocc, nvir = t1.shape
+    fock = imds.eris.fock
+    foo = fock[:nocc,:nocc]
+    fvv = fock[nocc:,nocc:]
+
+    Hr1 = np.diag(imds.Lvv)
+    if eom.partition == 'mp':
+        foo_diag = np.diag(foo)
+        fvv_diag = np.diag(fvv)
+        Hr2 = - foo_diag[:,None,None] + fvv_diag[None,:,None] + fvv_diag[None,None,:]
+    else:
+        Lvv_diag = np.diag(imds.Lvv)
+        Loo_diag = np.diag(imds.Loo)
+        Hr2 = Lvv_diag[None,:,None] + Lvv_diag[None,None,:] - Loo_diag[:,None,None]
+        wjb = np.einsum('jbbj->jb', imds.Wovvo)
+        Hr2 += 2 * wjb[:,None,:]
+        Hr2 += -np.einsum('ab,jb->jab', np.eye(nvir), wjb)
+        wjb = np.einsum('jbjb->jb', imds.Wovov)
+        Hr2 += -wjb[:,None,:]
+        Hr2 += -wjb[:,:,None]
+        Hr2 += np.einsum('abab->ab', imds.Wvvvv)[None,:,:]
+        Hr2 += -2*np.einsum('ijab,ijab->jab', imds.Woovv, t2)
+        Hr2 += np.einsum('ijba,ijab->jab', imds.Woovv, t2)
+
+    vector = eom.amplitudes_to_vector(Hr1, Hr2)
+    return vector
+
+def eaccsd_matvec(eom, vector, imds=None, diag=None):
+    # Ref: Nooijen and Bartlett, J. Chem. Phys. 102, 3629 (1994) Eqs.(30)-(31)
+    if imds is None: imds = eom.make_imds()
+    nocc = eom.nocc
+    nmo = eom.nmo
+    r1, r2 = eom.vector_to_amplitudes(vector, nmo, nocc)
+
+    # Eq. (30)
+    # 1p-1p block
+    Hr1 =  np.einsum('ac,c->a', imds.Lvv, r1)
+    # 1p-2p1h block
+    Hr1 += 2*np.einsum('ld,lad->a', imds.Fov, r2)
+    Hr1 +=  -np.einsum('ld,lda->a', imds.Fov, r2)
+    Hr1 += 2*np.einsum('alcd,lcd->a', imds.Wvovv, r2)
+    Hr1 +=  -np.einsum('aldc,lcd->a', imds.Wvovv, r2)
+    # Eq. (31)
+    # 2p1h-1p block
+    Hr2 = np.einsum('abcj,c->jab', imds.Wvvvo, r1)
+    # 2p1h-2p1h block
+    if eom.partition == 'mp':
+        fock = imds.eris.fock
+        foo = fock[:nocc,:nocc]
+        fvv = fock[nocc:,nocc:]
+        Hr2 +=  np.einsum('ac,jcb->jab', fvv, r2)
+        Hr2 +=  np.einsum('bd,jad->jab', fvv, r2)
+        Hr2 += -np.einsum('lj,lab->jab', foo, r2)
+    elif eom.partition == 'full':
+        diag_matrix2 = vector_to_amplitudes_ea(diag, nmo, nocc)[1]
+        Hr2 += diag_matrix2 * r2
+    else:
+        Hr2 +=  np.einsum('ac,jcb->jab', imds.Lvv, r2)
+        Hr2 +=  np.einsum('bd,jad->jab', imds.Lvv, r2)
+        Hr2 += -np.einsum('lj,lab->jab', imds.Loo, r2)
+        Hr2 += 2*np.einsum('lbdj,lad->jab', imds.Wovvo, r2)
+        Hr2 +=  -np.einsum('lbjd,lad->jab', imds.Wovov, r2)
+        Hr2 +=  -np.einsum('lajc,lcb->jab', imds.Wovov, r2)
+        Hr2 +=  -np.einsum('lbcj,lca->jab', imds.Wovvo, r2)
+        Hr2 +=   np.einsum('abcd,jcd->jab', imds.Wvvvv, r2)
+        tmp = 2*np.einsum('klcd,lcd->k', imds.Woovv, r2)
+        tmp += -np.einsum('kldc,lcd->k', imds.Woovv, r2)
+        Hr2 += -np.einsum('k,kjab->jab', tmp, imds.t2)
+
+    vector = eom.amplitudes_to_vector(Hr1, Hr2)
+    return vector
+
+def vector_to_amplitudes_ea(vector, nmo, nocc):
+    nvir = nmo - nocc
+    r1 = vector[:nvir]
+    r2 = vector[nvir:].reshape(nocc,nvir,nvir)
+    return r1, r2
+
+def amplitudes_to_vector_ea(r1, r2):
+    return np.concatenate((r1, r2.ravel()))
+
+def eeccsd_diag(eom, imds=None):
+    if imds is None: imds = eom.make_imds()
+    Hr1 = np.diag(imds.Lvv)[None,:] - np.diag(imds.Loo)[:,None]
+    Hr2 = Hr1[:,None,:,None] + Hr1[None,:,None,:]
+    return eom.amplitudes_to_vector(Hr1, Hr2)
+
+def eeccsd_matvec(eom, vector, imds=None, diag=None):
+    '''
+    Spin-adapted singlet EOM-EE-CCSD matvec, the product of the
+    CCSD Jacobian with the (packed) singles and doubles vector.
+    The Jacobian is linearized once in :meth:`_IMDS.make_ee`.
+    '''
+    if imds is None: imds = eom.make_imds()
+    r1, r2 = eom.vector_to_amplitudes(vector, eom.nmo, eom.nocc)
+    Hr1, Hr2 = imds.jac(r1, r2)
+    return eom.amplitudes_to_vector(Hr1, Hr2)
+
+def _cc_residual(mycc, t1, t2, eris):
+    # <mu|exp(-T) H exp(T)|0> from the Jacobi update of update_amps
+    nocc = t1.shape[0]
+    mo_e = eris.mo_energy
+    eia = mo_e[:nocc,None] - (mo_e[None,nocc:] + mycc.level_shift)
+    eijab = eia[:,None,:,None] + eia[None,:,None,:]
+    t1new, t2new = mycc.update_amps(t1, t2, eris)
+    return eia * (t1new - t1), eijab * (t2new - t2)
+
+class _IMDS:
+    def __init__(self, cc, eris=None):
+        self._cc = cc
+        self.verbose = cc.verbose
+        self.stdout = cc.stdout
+        self.t1 = cc.t1
+        self.t2 = cc.t2
+        if eris is None:
+            eris = cc.ao2mo()
+        self.eris = eris
+        self._made_shared_2e = False
+
+    def _make_shared_1e(self):
+        t1, t2, eris = self.t1, self.t2, self.eris
+        self.Loo = imd.Loo(t1, t2, eris)
+        self.Lvv = imd.Lvv(t1, t2, eris)
+        self.Fov = imd.cc_Fov(t1, t2, eris)
+
+    def _make_shared_2e(self):
+        t1, t2, eris = self.t1, self.t2, self.eris
+        self.Woooo = imd.Woooo(t1, t2, eris)
+        self.Wovvo = imd.Wovvo(t1, t2, eris)
+        self.Wovov = imd.Wovov(t1, t2, eris)
+        self.Woovv = np.asarray(eris.ovov).transpose(0,2,1,3)
+        self._made_shared_2e = True
+
+    def make_ip(self, ip_partition=None):
+        self._make_shared_1e()
+        if not self._made_shared_2e and ip_partition != 'mp':
+            self._make_shared_2e()
+        t1, t2, eris = self.t1, self.t2, self.eris
+        self.Wooov = imd.Wooov(t1, t2, eris)
+        self.Wovoo = imd.Wovoo(t1, t2, eris)
+        return self
+
+    def make_ea(self, ea_partition=None):
+        self._make_shared_1e()
+        if not self._made_shared_2e and ea_partition != 'mp':
+            self._make_shared_2e()
+        t1, t2, eris = self.t1, self.t2, self.eris
+        self.Wvovv = imd.Wvovv(t1, t2, eris)
+        if ea_partition == 'mp':
+            self.Wvvvo = imd.Wvvvo(t1, t2, eris)
+        else:
+            self.Wvvvv = imd.Wvvvv(t1, t2, eris)
+            self.Wvvvo = imd.Wvvvo(t1, t2, eris, self.Wvvvv)
+        return self
+
+    def make_ee(self):
+        self._make_shared_1e()
+        mycc, eris = self._cc, self.eris
+        _, self.jac = jax.linearize(lambda t1, t2: _cc_residual(mycc, t1, t2, eris),
+                                    self.t1, self.t2)
+        return self
+
+IMDS_CACHE_SIZE = getattr(__config__, 'eom_rccsd_imds_cache_size', 4)
+
+def _get_imds(eom, kind, eris=None):
+    '''
+    EOM intermediates (and the diagonal) cached on the identity of
+    the amplitudes and the integrals.
+
+    The cache lives on the CC object (``mycc._eom_imds``), and is released
+    along with it. The cached entries hold references to the keys,
+    so that their ids cannot be reused while they are in the cache.
+    '''
+    mycc = eom._cc
+    if eris is None:
+        keys = (mycc.t1, mycc.t2, mycc.mo_coeff)
+    else:
+        keys = (mycc.t1, mycc.t2, eris)
+
+    def build():
+        imds = _IMDS(mycc, eris)
+        if kind == 'ip':
+            return imds.make_ip(eom.partition)
+        elif kind == 'ea':
+            return imds.make_ea(eom.partition)
+        else:
+            return imds.make_ee()
+
+    if any(isinstance(x, core.Tracer) for x in
+           (mycc.t1, mycc.t2, mycc.mo_coeff, getattr(eris, 'fock', None))):
+        return build()
+
+    cache = mycc._eom_imds
+    key = (kind, eom.partition) + tuple(id(x) for x in keys)
+    if key in cache:
+        cache.move_to_end(key)
+        logger.debug(eom, 'Reuse the cached EOM-%s intermediates', kind.upper())
+        return cache[key][1]
+
+    imds = build()
+    cache[key] = (keys, imds)
+    while len(cache) > IMDS_CACHE_SIZE:
+        cache.popitem(last=False)
+    return imds
+
 class EOMIP(EOM, pyscf_eom_rccsd.EOMIP):
+    kernel = kernel
+    ipccsd = kernel
     get_diag = ipccsd_diag
     matvec = ipccsd_matvec
 
+    def vector_to_amplitudes(self, vector, nmo=None, nocc=None):
+        if nmo is None: nmo = self.nmo
+        if nocc is None: nocc = self.nocc
+        return vector_to_amplitudes_ip(vector, nmo, nocc)
+
+    def amplitudes_to_vector(self, r1, r2):
+        return amplitudes_to_vector_ip(r1, r2)
+
+    def make_imds(self, eris=None):
+        return _get_imds(self, 'ip', eris)
+
 class EOMEA(EOM, pyscf_eom_rccsd.EOMEA):
-    pass
+    kernel = kernel
+    eaccsd = kernel
+    get_diag = eaccsd_diag
+    matvec = eaccsd_matvec
+
+    def vector_to_amplitudes(self, vector, nmo=None, nocc=None):
+        if nmo is None: nmo = self.nmo
+        if nocc is None: nocc = self.nocc
+        return vector_to_amplitudes_ea(vector, nmo, nocc)
+
+    def amplitudes_to_vector(self, r1, r2):
+        return amplitudes_to_vector_ea(r1, r2)
+
+    def make_imds(self, eris=None):
+        return _get_imds(self, 'ea', eris)
 
 class EOMEE(EOM, pyscf_eom_rccsd.EOMEE):
-    pass
+    '''
+    Singlet excitations only.
+    '''
+    get_diag = eeccsd_diag
+    matvec = eeccsd_matvec
+
+    def kernel(self, nroots=1, koopmans=False, guess=None, eris=None, imds=None):
+        return kernel(self, nroots, False, koopmans, guess, None, eris, imds)
+    eeccsd = kernel
+
+    def vector_size(self):
+        nov = self.nocc * (self.nmo - self.nocc)
+        return nov + nov*(nov+1)//2
+
+    def vector_to_amplitudes(self, vector, nmo=None, nocc=None):
+        if nmo is None: nmo = self.nmo
+        if nocc is None: nocc = self.nocc
+        return ccsd.vector_to_amplitudes(vector, nmo, nocc)
+
+    def amplitudes_to_vector(self, r1, r2):
+        return ccsd.amplitudes_to_vector(r1, r2)
+
+    def make_imds(self, eris=None):
+        return _get_imds(self, 'ee', eris)
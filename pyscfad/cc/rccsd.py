@@ -1,13 +1,68 @@
+from collections import namedtuple
+from functools import partial
+import numpy
+import jax
+from jax import core
+from pyscf import lib as pyscf_lib
 from pyscf.lib import logger
-from pyscf.lib import direct_sum, current_memory
+from pyscf.lib import current_memory, prange, param
 from pyscfad import lib
 from pyscfad.lib import numpy as jnp
+from pyscfad.lib import diis
 from pyscfad import ao2mo
 from pyscfad.cc import ccsd
 from pyscfad.cc import rintermediates as imd
 
+# The (hashable) attributes of the CCSD object used by update_amps,
+# the ovvv dataset if it is stored on disk, and the blocked AO integrals
+# of the out-of-core eris
+_UpdateOptions = namedtuple('_UpdateOptions',
+                            ['level_shift', 'cc2', 'direct', 'max_memory', 'ovvv',
+                             'ao_blocks'])
+
 def update_amps(cc, t1, t2, eris):
-    nocc, nvir = t1.shape
+    '''
+    Jacobi update of the amplitudes.
+
+    The update is jit-compiled for each (nocc, nvir) and set of options,
+    so that the contraction paths are planned once and the compiled
+    kernel is reused across iterations and geometries.
+    '''
+    ovvv = getattr(eris, 'ovvv', None)
+    if ovvv is not None and ccsd._is_array(ovvv):
+        ovvv = None
+    options = _UpdateOptions(float(cc.level_shift), bool(cc.cc2),
+                             bool(cc.direct), cc.max_memory, ovvv,
+                             getattr(eris, 'ao_blocks', None))
+    return _update_amps_jit(options, t1, t2, _update_params(cc, eris))
+
+def _update_params(cc, eris):
+    '''
+    The integrals entering update_amps. They are built once per eris,
+    and carried on the eris returned by :func:`ccsd._params_to_eris`.
+    '''
+    params = getattr(eris, '_params', None)
+    if params is not None:
+        return params
+    params = ccsd._eris_to_params(eris)
+    if ((cc.direct or getattr(eris, 'vvvv', None) is None)
+            and 'eri_ao' not in params and 'vvL' not in params
+            and getattr(eris, 'ao_blocks', None) is None):
+        params['eri_ao'] = _get_eri_ao(cc)
+    return params
+
+@partial(jax.jit, static_argnums=0)
+def _update_amps_jit(options, t1, t2, params):
+    eris = _ChemistsERIs()
+    eris.nocc = t1.shape[0]
+    eris.max_memory = options.max_memory
+    eris.ovvv = options.ovvv
+    eris.ao_blocks = options.ao_blocks
+    eris = ccsd._params_to_eris(eris, params)
+    return _update_amps(options, t1, t2, eris)
+
+def _update_amps(cc, t1, t2, eris):
+    nocc = t1.shape[0]
     fock = eris.fock
     mo_e_o = eris.mo_energy[:nocc]
     mo_e_v = eris.mo_energy[nocc:] + cc.level_shift
@@ -26,6 +81,9 @@ def update_amps(cc, t1, t2, eris):
     Foo -= mo_oo
     Fvv -= mo_vv
 
+    # shared by the T1 and T2 equations
+    tau = t2 + jnp.einsum('ia,jb->ijab', t1, t1)
+
     # T1 equation
     t1new  =-2*jnp.einsum('kc,ka,ic->ia', fov, t1, t1)
     t1new +=   jnp.einsum('ac,ic->ia', Fvv, t1)
@@ -36,21 +94,22 @@ def update_amps(cc, t1, t2, eris):
     t1new += fov.conj()
     t1new += 2*jnp.einsum('kcai,kc->ia', eris.ovvo, t1)
     t1new +=  -jnp.einsum('kiac,kc->ia', eris.oovv, t1)
-    eris_ovvv = eris.get_ovvv()
-    t1new += 2*jnp.einsum('kdac,ikcd->ia', eris_ovvv, t2)
-    t1new +=  -jnp.einsum('kcad,ikcd->ia', eris_ovvv, t2)
-    t1new += 2*jnp.einsum('kdac,kd,ic->ia', eris_ovvv, t1, t1)
-    t1new +=  -jnp.einsum('kcad,kd,ic->ia', eris_ovvv, t1, t1)
     eris_ovoo = eris.ovoo
-    t1new +=-2*jnp.einsum('lcki,klac->ia', eris_ovoo, t2)
-    t1new +=   jnp.einsum('kcli,klac->ia', eris_ovoo, t2)
-    t1new +=-2*jnp.einsum('lcki,lc,ka->ia', eris_ovoo, t1, t1)
-    t1new +=   jnp.einsum('kcli,lc,ka->ia', eris_ovoo, t1, t1)
+    t1new +=-2*jnp.einsum('lcki,klac->ia', eris_ovoo, tau)
+    t1new +=   jnp.einsum('kcli,klac->ia', eris_ovoo, tau)
 
-    # T2 equation
+    # the ovvv terms of the T1 and T2 equations, in occupied blocks
     tmp2  = jnp.einsum('kibc,ka->abic', eris.oovv, -t1)
-    tmp2 += jnp.asarray(eris_ovvv).conj().transpose(1,3,0,2)
-    tmp = jnp.einsum('abic,jc->ijab', tmp2, t1)
+    tmp = []
+    for p0, p1, eris_ovvv in eris.loop_ovvv():
+        t1new += 2*jnp.einsum('kdac,ikcd->ia', eris_ovvv, tau[:,p0:p1])
+        t1new +=  -jnp.einsum('kcad,ikcd->ia', eris_ovvv, tau[:,p0:p1])
+        tmp2_blk = tmp2[:,:,p0:p1] + eris_ovvv.conj().transpose(1,3,0,2)
+        tmp.append(jnp.einsum('abic,jc->ijab', tmp2_blk, t1))
+    eris_ovvv = tmp2_blk = None
+
+    # T2 equation
+    tmp = jnp.concatenate(tmp, axis=0)
     t2new = tmp + tmp.transpose(1,0,3,2)
     tmp2  = jnp.einsum('kcai,jc->akij', eris.ovvo, t1)
     tmp2 += eris_ovoo.transpose(1,3,0,2).conj()
@@ -63,10 +122,7 @@ def update_amps(cc, t1, t2, eris):
         Woooo2 += jnp.einsum('kclj,ic->klij', eris_ovoo, t1)
         Woooo2 += jnp.einsum('kcld,ic,jd->klij', eris.ovov, t1, t1)
         t2new += jnp.einsum('klij,ka,lb->ijab', Woooo2, t1, t1)
-        Wvvvv = jnp.einsum('kcbd,ka->abcd', eris_ovvv, -t1)
-        Wvvvv = Wvvvv + Wvvvv.transpose(1,0,3,2)
-        Wvvvv += eris.vvvv.transpose(0,2,1,3)
-        t2new += jnp.einsum('abcd,ic,jd->ijab', Wvvvv, t1, t1)
+        t2new += _add_vvvv(cc, t1, jnp.einsum('ia,jb->ijab', t1, t1), eris)
         Lvv2 = fvv - jnp.einsum('kc,ka->ac', fov, t1)
         Lvv2 -= jnp.diagflat(jnp.diag(fvv))
         tmp = jnp.einsum('ac,ijcb->ijab', Lvv2, t2)
@@ -84,11 +140,9 @@ def update_amps(cc, t1, t2, eris):
         Woooo = imd.cc_Woooo(t1, t2, eris)
         Wvoov = imd.cc_Wvoov(t1, t2, eris)
         Wvovo = imd.cc_Wvovo(t1, t2, eris)
-        Wvvvv = imd.cc_Wvvvv(t1, t2, eris)
 
-        tau = t2 + jnp.einsum('ia,jb->ijab', t1, t1)
         t2new += jnp.einsum('klij,klab->ijab', Woooo, tau)
-        t2new += jnp.einsum('abcd,ijcd->ijab', Wvvvv, tau)
+        t2new += _add_vvvv(cc, t1, tau, eris)
         tmp = jnp.einsum('ac,ijcb->ijab', Lvv, t2)
         t2new += tmp + tmp.transpose(1,0,3,2)
         tmp = jnp.einsum('ki,kjab->ijab', Loo, t2)
@@ -102,11 +156,162 @@ def update_amps(cc, t1, t2, eris):
         t2new -= tmp + tmp.transpose(1,0,3,2)
 
     eia = mo_e_o[:,None] - mo_e_v
-    eijab = direct_sum('ia,jb->ijab',eia,eia)
+    eijab = eia[:,None,:,None] + eia[None,:,None,:]
     t1new /= eia
     t2new /= eijab
     return t1new, t2new
 
+def energy(cc, t1=None, t2=None, eris=None):
+    '''RCCSD correlation energy'''
+    if t1 is None: t1 = cc.t1
+    if t2 is None: t2 = cc.t2
+    if eris is None: eris = cc.ao2mo()
+
+    nocc, nvir = t1.shape
+    fock = eris.fock
+    e = 2*jnp.einsum('ia,ia', fock[:nocc,nocc:], t1)
+    tau = t2 + jnp.einsum('ia,jb->ijab', t1, t1)
+    eris_ovov = eris.ovov
+    e += 2*jnp.einsum('ijab,iajb', tau, eris_ovov)
+    e +=  -jnp.einsum('ijab,ibja', tau, eris_ovov)
+    return e.real
+
+def kernel(mycc, eris=None, t1=None, t2=None, max_cycle=50, tol=1e-8,
+           tolnormt=1e-6, verbose=None):
+    '''
+    CCSD iterations compiled into a single ``lax.while_loop``,
+    accelerated by :class:`pyscfad.lib.diis.DIIS`.
+    '''
+    log = logger.new_logger(mycc, verbose)
+    cput0 = (logger.process_clock(), logger.perf_counter())
+    if eris is None:
+        eris = mycc.ao2mo(mycc.mo_coeff)
+    if getattr(eris, '_params', None) is None:
+        eris = ccsd._params_to_eris(eris, _update_params(mycc, eris))
+    if t1 is None and t2 is None:
+        t1, t2 = mycc.get_init_guess(eris)
+    elif t2 is None:
+        t2 = mycc.get_init_guess(eris)[1]
+
+    # the DIIS history is kept in the packed amplitude vector
+    nmo = t1.shape[0] + t1.shape[1]
+    nocc = t1.shape[0]
+    vec = mycc.amplitudes_to_vector(t1, t2)
+    unravel = lambda vec: mycc.vector_to_amplitudes(vec, nmo, nocc)
+    adiis = None
+    diis_state = None
+    if mycc.diis:
+        adiis = diis.DIIS(mycc.diis_space, mycc.diis_start_cycle+1)
+        diis_state = adiis.init(vec)
+    damp = mycc.iterative_damping
+    eccsd = mycc.energy(t1, t2, eris)
+    log.info('Init E_corr(CCSD) = %.15g', eccsd)
+
+    def body(carry):
+        cycle, vec, e, _, _, diis_state = carry
+        vecnew = mycc.amplitudes_to_vector(*mycc.update_amps(*unravel(vec), eris))
+        dvec = vecnew - vec
+        normt = jnp.linalg.norm(dvec)
+        if damp < 1.:
+            vecnew = vec + damp * dvec
+        if adiis is not None:
+            diis_state, vecnew = adiis.update(diis_state, vecnew, dvec)
+        enew = mycc.energy(*unravel(vecnew), eris)
+        return cycle+1, vecnew, enew, enew-e, normt, diis_state
+
+    def cond(carry):
+        cycle, _, _, de, normt, _ = carry
+        return (cycle < max_cycle) & ((abs(de) > tol) | (normt > tolnormt))
+
+    carry = (0, vec, eccsd, jnp.inf, jnp.inf, diis_state)
+    cycle, vec, eccsd, de, normt, _ = jax.lax.while_loop(cond, body, carry)
+    conv = bool((abs(de) <= tol) & (normt <= tolnormt))
+    log.info('cycle = %d  E_corr(CCSD) = %.15g  dE = %.9g  norm(t1,t2) = %.6g',
+             cycle, eccsd, de, normt)
+    log.timer('CCSD', *cput0)
+    t1, t2 = unravel(vec)
+    return conv, eccsd, t1, t2
+
+def _add_vvvv(mycc, t1, tau, eris):
+    '''
+    Particle-particle ladder term sum_cd W_abcd tau_ijcd.
+    With ``mycc.direct`` or without ``eris.vvvv``, neither vvvv nor Wvvvv
+    is built, and the (ac|bd) contribution is computed with the AO integrals.
+    '''
+    if not mycc.direct and eris.vvvv is not None:
+        Wvvvv = imd.cc_Wvvvv(t1, None, eris)
+        return jnp.einsum('abcd,ijcd->ijab', Wvvvv, tau)
+    vvL = getattr(eris, 'vvL', None)
+
+    Ht2 = 0
+    for p0, p1, eris_ovvv in eris.loop_ovvv():
+        tmp = jnp.einsum('kdac,ijcd->ijka', eris_ovvv, tau)
+        Ht2 -= jnp.einsum('ijka,kb->ijab', tmp, t1[p0:p1])
+        tmp = jnp.einsum('kcbd,ijcd->ijkb', eris_ovvv, tau)
+        Ht2 -= jnp.einsum('ijkb,ka->ijab', tmp, t1[p0:p1])
+    if vvL is not None:
+        Ht2 += _contract_vvvv_df(mycc, tau, vvL)
+    else:
+        Ht2 += _contract_vvvv_ao(mycc, tau, eris)
+    return Ht2
+
+def _contract_vvvv_df(mycc, tau, vvL):
+    '''
+    sum_cd (ac|bd) tau_ijcd with (ac|bd) = sum_L (ac|L)(L|bd),
+    assembled for a block of a at a time
+    '''
+    nocc = tau.shape[0]
+    nvir = vvL.shape[0]
+    max_memory = max(0, mycc.max_memory - current_memory()[0])
+    blksize = int(min(nvir, max(1, max_memory*1e6/8/(nvir**3+nocc**2*nvir))))
+    Ht2 = []
+    for p0, p1 in prange(0, nvir, blksize):
+        vvvv = jnp.einsum('acL,bdL->acbd', vvL[p0:p1], vvL)
+        Ht2.append(jnp.einsum('acbd,ijcd->ijab', vvvv, tau))
+    return jnp.concatenate(Ht2, axis=2)
+
+def _contract_vvvv_ao(mycc, tau, eris):
+    '''
+    sum_cd (ac|bd) tau_ijcd computed by back-transforming tau to the AO basis
+    '''
+    nocc = tau.shape[0]
+    mo_v = eris.mo_coeff[:,nocc:]
+    nao = mo_v.shape[0]
+    eri_ao = getattr(eris, 'eri_ao', None)
+    ao_blocks = getattr(eris, 'ao_blocks', None)
+    if eri_ao is None and ao_blocks is not None:
+        # the AO integrals in blocks of shells of l
+        tau_ao = jnp.einsum('ijcd,nd->ijcn', tau, mo_v)
+        tau_ao = jnp.einsum('ijcn,mc->ijmn', tau_ao, mo_v)
+        Ht2 = 0
+        for p0, p1, eri_blk in ao_blocks:
+            tmp = jnp.einsum('lmsn,ijmn->ijls', eri_blk, tau_ao)
+            tmp = jnp.einsum('ijls,sb->ijlb', tmp, mo_v.conj())
+            Ht2 += jnp.einsum('ijlb,la->ijab', tmp, mo_v[p0:p1].conj())
+        return Ht2
+
+    if eri_ao is None:
+        eri_ao = _get_eri_ao(mycc)
+    eri_ao = eri_ao.reshape([nao]*4)
+
+    max_memory = max(0, mycc.max_memory - current_memory()[0])
+    blksize = int(min(nocc, max(1, max_memory*1e6/8/(3*nocc*nao**2))))
+    Ht2 = []
+    for p0, p1 in prange(0, nocc, blksize):
+        tau_ao = jnp.einsum('ijcd,nd->ijcn', tau[p0:p1], mo_v)
+        tau_ao = jnp.einsum('ijcn,mc->ijmn', tau_ao, mo_v)
+        tmp = jnp.einsum('lmsn,ijmn->ijls', eri_ao, tau_ao)
+        tau_ao = None
+        tmp = jnp.einsum('ijls,sb->ijlb', tmp, mo_v.conj())
+        Ht2.append(jnp.einsum('ijlb,la->ijab', tmp, mo_v.conj()))
+    return jnp.concatenate(Ht2, axis=0)
+
+def _get_eri_ao(mycc):
+    eri_ao = mycc._scf._eri
+    if eri_ao is None:
+        eri_ao = mycc._scf.mol.intor('int2e', aosym='s1')
+    return eri_ao
+
 @lib.dataclass
 class RCCSD(ccsd.CCSD):
     def kernel(self, t1=None, t2=None, eris=None, mbpt2=False):
@@ -118,7 +323,20 @@ class RCCSD(ccsd.CCSD):
 
         if eris is None:
             eris = self.ao2mo(self.mo_coeff)
-        return ccsd.CCSD.ccsd(self, t1, t2, eris)
+        # the integrals of update_amps are built once here
+        eris = ccsd._params_to_eris(eris, _update_params(self, eris))
+        if not self.implicit_diff:
+            return ccsd.CCSD.ccsd(self, t1, t2, eris)
+
+        self.dump_flags()
+        self.e_hf = getattr(eris, 'e_hf', None)
+        if self.e_hf is None:
+            self.e_hf = self._scf.e_tot
+        self.t1, self.t2 = ccsd.solve_amplitudes(self, eris, t1, t2, kernel,
+                                                 params=eris._params)
+        self.e_corr = self.energy(self.t1, self.t2, eris)
+        self._finalize()
+        return self.e_corr, self.t1, self.t2
 
     def ao2mo(self, mo_coeff=None):
         nmo = self.nmo
@@ -127,14 +345,15 @@ class RCCSD(ccsd.CCSD):
         nao_pair = nao * (nao+1) // 2
         mem_incore = (max(nao_pair**2, nmo**4) + nmo_pair**2) * 8/1e6
         mem_now = current_memory()[0]
-        if (self._scf._eri is not None and
-            (mem_incore+mem_now < self.max_memory) or self.mol.incore_anyway):
+        if getattr(self._scf, 'with_df', None):
+            return _make_df_eris(self, mo_coeff)
+        elif ((self._scf._eri is not None and mem_incore+mem_now < self.max_memory)
+              or self.mol.incore_anyway):
             return _make_eris_incore(self, mo_coeff)
-        elif getattr(self._scf, 'with_df', None):
-            raise NotImplementedError
         else:
-            raise NotImplementedError
+            return _make_eris_outcore(self, mo_coeff)
 
+    energy = energy
     update_amps = update_amps
 
 def _make_eris_incore(mycc, mo_coeff=None, ao2mofn=None):
@@ -146,23 +365,189 @@ def _make_eris_incore(mycc, mo_coeff=None, ao2mofn=None):
 
     if callable(ao2mofn):
         eri1 = ao2mofn(eris.mo_coeff).reshape([nmo]*4)
+        eris.oooo = eri1[:nocc,:nocc,:nocc,:nocc]
+        eris.ovoo = eri1[:nocc,nocc:,:nocc,:nocc]
+        eris.ovov = eri1[:nocc,nocc:,:nocc,nocc:]
+        eris.oovv = eri1[:nocc,:nocc,nocc:,nocc:]
+        eris.ovvo = eri1[:nocc,nocc:,nocc:,:nocc]
+        eris.ovvv = eri1[:nocc,nocc:,nocc:,nocc:]
+        if not mycc.direct:
+            eris.vvvv = eri1[nocc:,nocc:,nocc:,nocc:]
     else:
-        eri1 = ao2mo.incore.full(mycc._scf._eri, eris.mo_coeff, compact=False)
-        #eri1 = ao2mo.restore(1, eri1, nmo)
-    eris.oooo = eri1[:nocc,:nocc,:nocc,:nocc]#.copy()
-    eris.ovoo = eri1[:nocc,nocc:,:nocc,:nocc]#.copy()
-    eris.ovov = eri1[:nocc,nocc:,:nocc,nocc:]#.copy()
-    eris.oovv = eri1[:nocc,:nocc,nocc:,nocc:]#.copy()
-    eris.ovvo = eri1[:nocc,nocc:,nocc:,:nocc]#.copy()
-    eris.ovvv = eri1[:nocc,nocc:,nocc:,nocc:]#.copy()
-    eris.vvvv = eri1[nocc:,nocc:,nocc:,nocc:]#.copy()
+        # only the blocks needed by CCSD; vvvv is skipped for direct CCSD
+        orbo = eris.mo_coeff[:,:nocc]
+        orbv = eris.mo_coeff[:,nocc:]
+        # with incore_anyway, the SCF may not hold the integrals
+        eri_ao = _get_eri_ao(mycc)
+        def _ao2mo(*mos):
+            return ao2mo.incore.general(eri_ao, mos,
+                                        max_memory=mycc.max_memory)
+        eris.oooo = _ao2mo(orbo, orbo, orbo, orbo)
+        eris.ovoo = _ao2mo(orbo, orbv, orbo, orbo)
+        eris.ovov = _ao2mo(orbo, orbv, orbo, orbv)
+        eris.oovv = _ao2mo(orbo, orbo, orbv, orbv)
+        eris.ovvo = _ao2mo(orbo, orbv, orbv, orbo)
+        eris.ovvv = _ao2mo(orbo, orbv, orbv, orbv)
+        if not mycc.direct:
+            eris.vvvv = _ao2mo(orbv, orbv, orbv, orbv)
+    if mycc.direct:
+        eris.eri_ao = mycc._scf._eri
     logger.timer(mycc, 'CCSD integral transformation', *cput0)
     return eris
 
+def _make_eris_outcore(mycc, mo_coeff=None):
+    '''
+    The blocks with at most two virtual indices are kept in memory.
+    ovvv is written to an HDF5 file in occupied blocks, and vvvv is not
+    built (the AO-direct ladder is used instead).
+    Without the SCF integrals, the AO integrals are computed in blocks of
+    shells, both for the transformation (:func:`ao2mo.outcore.general`)
+    and for the ladder (:class:`ao2mo.outcore.AOBlocks`).
+
+    Under AD nothing is written to disk; the ovvv blocks are recomputed
+    (and checkpointed) whenever they are accessed. The derivatives of
+    the AO integrals need the unsliced s1 tensor (see gto.moleintor),
+    which is built once and shared by the transformation and the ladder.
+    '''
+    cput0 = (logger.process_clock(), logger.perf_counter())
+    eri_scf = mycc._scf._eri
+    eris = _ChemistsERIs()
+    eris._common_init_(mycc, mo_coeff)
+    nocc = eris.nocc
+    orbo = eris.mo_coeff[:,:nocc]
+    orbv = eris.mo_coeff[:,nocc:]
+    nao, nvir = orbv.shape
+    mol = mycc.mol
+    eri_ao = mycc._scf._eri
+    traced = (isinstance(eris.mo_coeff, core.Tracer)
+              or any(isinstance(x, core.Tracer)
+                     for x in jax.tree_util.tree_leaves((mol, eri_ao))))
+    if eri_scf is None and not traced:
+        # the integrals computed by the Fock build of the SCF object
+        mycc._scf._eri = eri_ao = None
+    elif eri_ao is None:
+        eri_ao = _get_eri_ao(mycc)
+    # NOTE only a reference to the AO integrals is kept on eris
+    eris.eri_ao = eri_ao
+    if eri_ao is not None:
+        def _ao2mo(*mos):
+            return ao2mo.incore.general(eri_ao, mos, max_memory=mycc.max_memory)
+    else:
+        def _ao2mo(*mos):
+            return jnp.asarray(ao2mo.outcore.general(mol, mos,
+                                                     max_memory=mycc.max_memory))
+        # a block of (lm|sn) and the (ij|ls) intermediates of the ladder
+        max_memory = max(0, mycc.max_memory - current_memory()[0])
+        blksize = int(max(1, max_memory*1e6/8/(nao**3 + 2*nocc**2*nao)))
+        eris.ao_blocks = ao2mo.outcore.AOBlocks(mol, blksize)
+    eris.oooo = _ao2mo(orbo, orbo, orbo, orbo)
+    eris.ovoo = _ao2mo(orbo, orbv, orbo, orbo)
+    eris.ovov = _ao2mo(orbo, orbv, orbo, orbv)
+    eris.oovv = _ao2mo(orbo, orbo, orbv, orbv)
+    eris.ovvo = _ao2mo(orbo, orbv, orbv, orbo)
+
+    if traced:
+        eris.ovvv = None
+    else:
+        eris.feri = pyscf_lib.H5TmpFile()
+        eris.ovvv = eris.feri.create_dataset('ovvv', (nocc,nvir,nvir,nvir),
+                                             eris.mo_coeff.dtype.char)
+        max_memory = max(0, mycc.max_memory - current_memory()[0])
+        blksize = int(min(nocc, max(1, max_memory*1e6/8/(2*nvir**3+nao**2*nvir))))
+        for p0, p1 in prange(0, nocc, blksize):
+            eris.ovvv[p0:p1] = numpy.asarray(_ao2mo(orbo[:,p0:p1], orbv, orbv, orbv))
+    logger.timer(mycc, 'CCSD integral transformation', *cput0)
+    return eris
+
+def _make_df_eris(mycc, mo_coeff=None):
+    '''
+    Density fitted integrals. The 3-index (oo|L), (ov|L) and (vv|L)
+    are kept, and the 4-index blocks with at most two virtual indices
+    are assembled from them. ovvv is assembled on access and vvvv
+    is never built.
+    ``mycc._scf.with_df`` is a PySCF DF object (e.g., ``pyscf.df.DF``)
+    attached to the SCF object; the SCF itself need not be density fitted.
+    '''
+    cput0 = (logger.process_clock(), logger.perf_counter())
+    eris = _ChemistsERIs()
+    eris._common_init_(mycc, mo_coeff)
+    nocc = eris.nocc
+    orbo = eris.mo_coeff[:,:nocc]
+    orbv = eris.mo_coeff[:,nocc:]
+
+    with_df = mycc._scf.with_df
+    cderi = ao2mo.incore.get_cderi(with_df, mycc.mol)
+    eris.ooL = ooL = ao2mo.incore.general_df(cderi, (orbo, orbo))
+    eris.ovL = ovL = ao2mo.incore.general_df(cderi, (orbo, orbv))
+    eris.vvL = vvL = ao2mo.incore.general_df(cderi, (orbv, orbv))
+    eris.oooo = jnp.einsum('ijL,klL->ijkl', ooL, ooL)
+    eris.ovoo = jnp.einsum('iaL,jkL->iajk', ovL, ooL)
+    eris.ovov = jnp.einsum('iaL,jbL->iajb', ovL, ovL)
+    eris.oovv = jnp.einsum('ijL,abL->ijab', ooL, vvL)
+    eris.ovvo = jnp.einsum('iaL,jbL->iabj', ovL, ovL)
+    eris.ovvv = None
+    logger.timer(mycc, 'DF-CCSD integral transformation', *cput0)
+    return eris
+
+def _recompute_ovvv(eris, *slices):
+    nocc = eris.nocc
+    orbo = eris.mo_coeff[:,:nocc]
+    orbv = eris.mo_coeff[:,nocc:]
+    if slices:
+        orbo = orbo[:,slices[0]]
+    # the AO integrals are shared with the other blocks (see _make_eris_outcore)
+    @jax.checkpoint
+    def _ovvv(eri_ao, orbo, orbv):
+        return ao2mo.incore.general(eri_ao, (orbo, orbv, orbv, orbv))
+    ovvv = _ovvv(eris.eri_ao, orbo, orbv)
+    if len(slices) > 1:
+        ovvv = ovvv[(slice(None),) + tuple(slices[1:])]
+    return ovvv
+
 class _ChemistsERIs(ccsd._ChemistsERIs):
     def get_ovvv(self, *slices):
         '''To access a subblock of ovvv tensor'''
+        if self.ovvv is None and getattr(self, 'vvL', None) is not None:
+            ovL = self.ovL
+            if slices:
+                ovL = ovL[slices[0]]
+            ovvv = jnp.einsum('iaL,bcL->iabc', ovL, self.vvL)
+            if len(slices) > 1:
+                ovvv = ovvv[(slice(None),) + tuple(slices[1:])]
+            return ovvv
+        elif self.ovvv is None:
+            return _recompute_ovvv(self, *slices)
+        elif not ccsd._is_array(self.ovvv):
+            return _read_ovvv(self.ovvv, slices)
         if slices:
-            return self.ovvv[slices]
+            return jnp.asarray(self.ovvv[slices])
         else:
-            return self.ovvv
+            return jnp.asarray(self.ovvv)
+
+    def loop_ovvv(self, blksize=None):
+        '''
+        Occupied blocks (p0, p1, ovvv[p0:p1]). In-memory ovvv is given
+        as a single block; otherwise the blocks fit in max_memory.
+        '''
+        nocc = self.nocc
+        if self.ovvv is not None and ccsd._is_array(self.ovvv):
+            yield 0, nocc, jnp.asarray(self.ovvv)
+            return
+        if blksize is None:
+            nvir = self.fock.shape[0] - nocc
+            max_memory = getattr(self, 'max_memory', param.MAX_MEMORY)
+            max_memory = max(0, max_memory - current_memory()[0])
+            # the block and the intermediates of its contraction
+            blksize = int(min(nocc, max(1, max_memory*1e6/8/(3*nvir**3))))
+        for p0, p1 in prange(0, nocc, blksize):
+            yield p0, p1, self.get_ovvv(slice(p0, p1))
+
+def _read_ovvv(dataset, slices):
+    '''
+    Read a block of ovvv from disk. The read is a callback,
+    so that the streaming also works inside jit.
+    '''
+    shape = numpy.broadcast_to(numpy.zeros((), dtype=bool),
+                               dataset.shape)[slices].shape
+    return jax.pure_callback(lambda: numpy.asarray(dataset[slices]),
+                             jax.ShapeDtypeStruct(shape, dataset.dtype))
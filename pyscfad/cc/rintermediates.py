@@ -1,13 +1,25 @@
 '''
 Intermediates for restricted CCSD.  Complex integrals are supported.
 '''
-from pyscf.lib import logger
+from pyscf.lib import logger, param
 from pyscfad import lib
+from pyscfad import ao2mo
 from pyscfad.lib import numpy as np
 
 # This is restricted (R)CCSD
 # Ref: Hirata et al., J. Chem. Phys. 120, 2581 (2004)
 
+def _loop_ovvv(eris):
+    '''
+    Occupied blocks (p0, p1, ovvv[p0:p1]), streamed if ovvv is on disk
+    '''
+    loop_ovvv = getattr(eris, 'loop_ovvv', None)
+    if loop_ovvv is not None:
+        yield from loop_ovvv()
+    else:
+        eris_ovvv = np.asarray(eris.get_ovvv())
+        yield 0, eris_ovvv.shape[0], eris_ovvv
+
 ### Eqs. (37)-(39) "kappa"
 
 def cc_Foo(t1, t2, eris):
@@ -56,9 +68,9 @@ def Lvv(t1, t2, eris):
     nocc, nvir = t1.shape
     fov = eris.fock[:nocc,nocc:]
     Lac = cc_Fvv(t1, t2, eris) - np.einsum('kc,ka->ac',fov, t1)
-    eris_ovvv = np.asarray(eris.get_ovvv())
-    Lac += 2*np.einsum('kdac,kd->ac', eris_ovvv, t1)
-    Lac -=   np.einsum('kcad,kd->ac', eris_ovvv, t1)
+    for p0, p1, eris_ovvv in _loop_ovvv(eris):
+        Lac += 2*np.einsum('kdac,kd->ac', eris_ovvv, t1[p0:p1])
+        Lac -=   np.einsum('kcad,kd->ac', eris_ovvv, t1[p0:p1])
     return Lac
 
 ### Eqs. (42)-(45) "chi"
@@ -82,9 +94,9 @@ def cc_Wvvvv(t1, t2, eris):
     return Wabcd
 
 def cc_Wvoov(t1, t2, eris):
-    eris_ovvv = np.asarray(eris.get_ovvv())
     eris_ovoo = np.asarray(eris.ovoo)
-    Wakic  = lib.einsum('kcad,id->akic', eris_ovvv, t1)
+    Wakic  = np.concatenate([lib.einsum('kcad,id->akic', eris_ovvv, t1)
+                             for _, _, eris_ovvv in _loop_ovvv(eris)], axis=1)
     Wakic -= lib.einsum('kcli,la->akic', eris_ovoo, t1)
     Wakic += np.asarray(eris.ovvo).transpose(2,0,3,1)
     eris_ovov = np.asarray(eris.ovov)
@@ -95,9 +107,9 @@ def cc_Wvoov(t1, t2, eris):
     return Wakic
 
 def cc_Wvovo(t1, t2, eris):
-    eris_ovvv = np.asarray(eris.get_ovvv())
     eris_ovoo = np.asarray(eris.ovoo)
-    Wakci  = lib.einsum('kdac,id->akci', eris_ovvv, t1)
+    Wakci  = np.concatenate([lib.einsum('kdac,id->akci', eris_ovvv, t1)
+                             for _, _, eris_ovvv in _loop_ovvv(eris)], axis=1)
     Wakci -= lib.einsum('lcki,la->akci', eris_ovoo, t1)
     Wakci += np.asarray(eris.oovv).transpose(2,0,3,1)
     eris_ovov = np.asarray(eris.ovov)
@@ -209,11 +221,12 @@ def Wovoo(t1, t2, eris):
     return Wkbij
 
 def _get_vvvv(eris):
-    if eris.vvvv is None and getattr(eris, 'vvL', None) is not None:  # DF eris
-        raise NotImplementedError
-    #    vvL = np.asarray(eris.vvL)
-    #    nvir = int(np.sqrt(eris.vvL.shape[0]*2))
-    #    return ao2mo.restore(1, lib.dot(vvL, vvL.T), nvir)
+    if eris.vvvv is None:
+        if getattr(eris, 'vvL', None) is not None:  # DF eris
+            vvL = np.asarray(eris.vvL)
+            return lib.einsum('acL,bdL->acbd', vvL, vvL)
+        # direct or outcore eris
+        return _make_vvvv(eris)
     elif eris.vvvv.ndim == 2:
     #    nvir = int(np.sqrt(eris.vvvv.shape[0]*2))
     #    return ao2mo.restore(1, np.asarray(eris.vvvv), nvir)
@@ -221,6 +234,24 @@ def _get_vvvv(eris):
     else:
         return eris.vvvv
 
+def _make_vvvv(eris):
+    '''
+    (ab|cd) transformed from the AO integrals, for eris built without vvvv
+    '''
+    mo_coeff = getattr(eris, 'mo_coeff', None)
+    eri_ao = getattr(eris, 'eri_ao', None)
+    mol = getattr(eris, 'mol', None)
+    if mo_coeff is None or (eri_ao is None and mol is None):
+        raise NotImplementedError('eris.vvvv is not available, and cannot be '
+                                  'built without the MO coefficients and '
+                                  'the AO integrals.')
+    orbv = mo_coeff[:,eris.nocc:]
+    max_memory = getattr(eris, 'max_memory', param.MAX_MEMORY)
+    if eri_ao is None:
+        # e.g., the out-of-core eris, which hold no AO integrals
+        return np.asarray(ao2mo.outcore.general(mol, (orbv,)*4, max_memory))
+    return ao2mo.incore.general(eri_ao, (orbv,)*4, max_memory=max_memory)
+
 def _cp(a):
     return np.array(a, copy=False, order='C')
 
@@ -0,0 +1,97 @@
+import pytest
+import numpy
+import jax
+import pyscf
+from pyscf import df as pyscf_df
+from pyscfad import gto, scf, cc
+
+@pytest.fixture
+def get_mol0():
+    mol = pyscf.M(
+        atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587',
+        basis = 'sto3g',
+        verbose=0,
+    )
+    return mol
+
+@pytest.fixture
+def get_mol():
+    mol = gto.Mole()
+    mol.atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587'
+    mol.basis = 'sto3g'
+    mol.verbose=0
+    mol.build()
+    return mol
+
+def _ccsd(mol, direct=False, implicit_diff=True, outcore=False):
+    mf = scf.RHF(mol)
+    mf.kernel()
+    if outcore:
+        # neither the AO integrals nor the in-core eris fit
+        mf._eri = None
+    mycc = cc.RCCSD(mf)
+    if outcore:
+        mycc.max_memory = 1
+    mycc.direct = direct
+    mycc.implicit_diff = implicit_diff
+    mycc.conv_tol = 1e-10
+    mycc.conv_tol_normt = 1e-8
+    mycc.kernel()
+    return mycc.e_tot
+
+def test_direct(get_mol):
+    mol = get_mol
+    e0 = _ccsd(mol, direct=False)
+    e1 = _ccsd(mol, direct=True)
+    assert abs(e1 - e0) < 1e-9
+
+    g0 = jax.grad(_ccsd)(mol, False).coords
+    g1 = jax.grad(_ccsd)(mol, True).coords
+    assert abs(g1 - g0).max() < 1e-7
+
+def test_nuc_grad(get_mol0, get_mol):
+    mol = get_mol
+    g = jax.grad(_ccsd)(mol).coords
+
+    mf0 = pyscf.scf.RHF(get_mol0).run(conv_tol=1e-12)
+    mycc0 = pyscf.cc.RCCSD(mf0).run(conv_tol=1e-10, conv_tol_normt=1e-8)
+    g0 = mycc0.nuc_grad_method().kernel()
+    assert abs(g - g0).max() < 1e-6
+
+    # the unrolled solver
+    g1 = jax.grad(_ccsd)(mol, False, False).coords
+    assert abs(g1 - g).max() < 1e-6
+
+def test_outcore(get_mol):
+    mol = get_mol
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mf._eri = None
+    mycc = cc.RCCSD(mf)
+    mycc.max_memory = 1
+    eris = mycc.ao2mo()
+    assert eris.eri_ao is None
+    assert not isinstance(eris.ovvv, numpy.ndarray)
+
+    e0 = _ccsd(mol)
+    e1 = _ccsd(mol, outcore=True)
+    assert abs(e1 - e0) < 1e-9
+
+    g0 = jax.grad(_ccsd)(mol).coords
+    g1 = jax.grad(_ccsd)(mol, False, True, True).coords
+    assert abs(g1 - g0).max() < 1e-7
+
+def test_df(get_mol0, get_mol):
+    mf = scf.RHF(get_mol)
+    mf.kernel()
+    mf.with_df = pyscf_df.DF(get_mol, auxbasis='weigend')
+    # the DF integrals are used even if the AO integrals are in memory
+    mf.mol.incore_anyway = True
+    mycc = cc.RCCSD(mf)
+    eris = mycc.ao2mo()
+    assert eris.vvL is not None
+    mycc.kernel(eris=eris)
+
+    mf0 = pyscf.scf.RHF(get_mol0).run()
+    mycc0 = pyscf.cc.RCCSD(mf0).density_fit(auxbasis='weigend').run()
+    assert abs(mycc.e_corr - mycc0.e_corr) < 1e-7
@@ -0,0 +1,68 @@
+import pytest
+import jax
+import pyscf
+from pyscf.cc import ccsd_t as pyscf_ccsd_t
+from pyscfad import gto, scf, cc
+
+def _mol0(coords=None):
+    mol = pyscf.M(
+        atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587',
+        basis = 'sto3g',
+        verbose=0,
+    )
+    if coords is not None:
+        mol.set_geom_(coords, unit='Bohr')
+    return mol
+
+@pytest.fixture
+def get_mol0():
+    return _mol0()
+
+@pytest.fixture
+def get_mol():
+    mol = gto.Mole()
+    mol.atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587'
+    mol.basis = 'sto3g'
+    mol.verbose=0
+    mol.build()
+    return mol
+
+def _ccsd_t(mol):
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mycc = cc.RCCSD(mf)
+    mycc.conv_tol = 1e-10
+    mycc.conv_tol_normt = 1e-8
+    mycc.kernel()
+    return mycc.e_tot + mycc.ccsd_t()
+
+def _ccsd_t0(mol0):
+    mf0 = pyscf.scf.RHF(mol0).run(conv_tol=1e-12)
+    mycc0 = pyscf.cc.RCCSD(mf0).run(conv_tol=1e-11, conv_tol_normt=1e-9)
+    return mycc0.e_tot + pyscf_ccsd_t.kernel(mycc0, mycc0.ao2mo())
+
+# pylint: disable=redefined-outer-name
+def test_ccsd_t(get_mol0, get_mol):
+    mf = scf.RHF(get_mol)
+    mf.kernel()
+    mycc = cc.RCCSD(mf)
+    mycc.kernel()
+    et = mycc.ccsd_t()
+
+    mf0 = pyscf.scf.RHF(get_mol0).run()
+    mycc0 = pyscf.cc.RCCSD(mf0).run()
+    et0 = pyscf_ccsd_t.kernel(mycc0, mycc0.ao2mo())
+    assert abs(et - et0) < 1e-9
+
+def test_nuc_grad(get_mol0, get_mol):
+    g = jax.grad(_ccsd_t)(get_mol).coords
+
+    coords = get_mol0.atom_coords()
+    disp = 1e-4
+    for ia, x in ((0, 2), (1, 1), (2, 2)):
+        cp = coords.copy()
+        cp[ia,x] += disp
+        ep = _ccsd_t0(_mol0(cp))
+        cp[ia,x] -= 2*disp
+        em = _ccsd_t0(_mol0(cp))
+        assert abs(g[ia,x] - (ep - em) / (2*disp)) < 1e-6
@@ -0,0 +1,114 @@
+import pytest
+import jax
+import pyscf
+from pyscfad import gto, scf, cc
+from pyscfad.cc import eom_rccsd
+
+def _mol0(coords=None):
+    mol = pyscf.M(
+        atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587',
+        basis = 'sto3g',
+        verbose=0,
+    )
+    if coords is not None:
+        mol.set_geom_(coords, unit='Bohr')
+    return mol
+
+@pytest.fixture
+def get_mol0():
+    return _mol0()
+
+@pytest.fixture
+def get_mol():
+    mol = gto.Mole()
+    mol.atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587'
+    mol.basis = 'sto3g'
+    mol.verbose=0
+    mol.build()
+    return mol
+
+def _ccsd(mol):
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mycc = cc.RCCSD(mf)
+    mycc.conv_tol = 1e-10
+    mycc.conv_tol_normt = 1e-8
+    mycc.kernel()
+    return mycc
+
+def _ccsd0(mol0):
+    mf0 = pyscf.scf.RHF(mol0).run(conv_tol=1e-12)
+    mycc0 = pyscf.cc.RCCSD(mf0)
+    mycc0.conv_tol = 1e-10
+    mycc0.conv_tol_normt = 1e-8
+    return mycc0.run()
+
+# pylint: disable=redefined-outer-name
+def test_ipccsd_nroots(get_mol0, get_mol):
+    mycc = _ccsd(get_mol)
+    e = mycc.ipccsd(nroots=3)[0]
+    e_left = mycc.ipccsd(nroots=3, left=True)[0]
+
+    mycc0 = _ccsd0(get_mol0)
+    e0 = mycc0.ipccsd(nroots=3)[0]
+    assert abs(e - e0).max() < 1e-6
+    assert abs(e_left - e0).max() < 1e-6
+
+def test_ipccsd_grad(get_mol0, get_mol):
+    def ip(mol, left=False):
+        return _ccsd(mol).ipccsd(nroots=1, left=left)[0]
+    g = jax.grad(ip)(get_mol).coords
+    g_left = jax.grad(ip)(get_mol, True).coords
+    assert abs(g_left - g).max() < 1e-6
+
+    coords = get_mol0.atom_coords()
+    disp = 1e-4
+    for ia, x in ((0, 2), (1, 1), (2, 2)):
+        cp = coords.copy()
+        cp[ia,x] += disp
+        ep = _ccsd0(_mol0(cp)).ipccsd(nroots=1)[0]
+        cp[ia,x] -= 2*disp
+        em = _ccsd0(_mol0(cp)).ipccsd(nroots=1)[0]
+        assert abs(g[ia,x] - (ep - em) / (2*disp)) < 1e-5
+
+def test_eaccsd(get_mol0, get_mol):
+    mycc = _ccsd(get_mol)
+    e = mycc.eaccsd(nroots=3)[0]
+
+    mycc0 = _ccsd0(get_mol0)
+    e0 = mycc0.eaccsd(nroots=3)[0]
+    assert abs(e - e0).max() < 1e-6
+
+    # vvvv is built from the AO integrals
+    mycc.direct = True
+    e1 = mycc.eaccsd(nroots=3, eris=mycc.ao2mo())[0]
+    assert abs(e1 - e0).max() < 1e-6
+
+def test_eeccsd(get_mol0, get_mol):
+    mycc = _ccsd(get_mol)
+    e = mycc.eeccsd(nroots=2)[0]
+
+    mycc0 = _ccsd0(get_mol0)
+    e0 = mycc0.eomee_ccsd_singlet(nroots=2)[0]
+    assert abs(e - e0).max() < 1e-6
+
+def test_imds_cache(get_mol):
+    mycc = _ccsd(get_mol)
+    e_ip = mycc.ipccsd(nroots=2)[0]
+    imds = eom_rccsd.EOMIP(mycc).make_imds()
+    e_ea = mycc.eaccsd(nroots=2)[0]
+    assert len(mycc._eom_imds) == 2
+
+    # the intermediates of both calls are reused
+    assert eom_rccsd.EOMIP(mycc).make_imds() is imds
+    assert abs(mycc.ipccsd(nroots=2)[0] - e_ip).max() < 1e-12
+    assert abs(mycc.eaccsd(nroots=2)[0] - e_ea).max() < 1e-12
+    assert len(mycc._eom_imds) == 2
+
+    # new amplitudes invalidate the cache
+    mycc.t1 = mycc.t1 + 0
+    assert eom_rccsd.EOMIP(mycc).make_imds() is not imds
+
+    # and the cache is not shared between CC objects
+    mycc1 = _ccsd(get_mol)
+    assert not mycc1._eom_imds
@@ -71,7 +71,7 @@ def get_veff(ks, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
     omega, alpha, hyb = ni.rsh_and_hybrid_coeff(ks.xc, spin=mol.spin)
     if abs(hyb) < 1e-10 and abs(alpha) < 1e-10:
         vk = None
-        if (ks._eri is None and ks.direct_scf and
+        if (ks.direct_scf and
             getattr(vhf_last, 'vj', None) is not None):
             ddm = jnp.asarray(dm) - jnp.asarray(dm_last)
             vj = ks.get_j(mol, ddm, hermi)
@@ -80,7 +80,7 @@ def get_veff(ks, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
             vj = ks.get_j(mol, dm, hermi)
         vxc.vxc += vj
     else:
-        if (ks._eri is None and ks.direct_scf and
+        if (ks.direct_scf and
             getattr(vhf_last, 'vk', None) is not None):
             ddm = jnp.asarray(dm) - jnp.asarray(dm_last)
             vj, vk = ks.get_jk(mol, ddm, hermi)
@@ -106,7 +106,9 @@ def get_veff(ks, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
         vxc.ecoul = jnp.einsum('ij,ji', dm, vj).real * .5
     else:
         vxc.ecoul = None
-
+    # kept for the incremental Fock build in the next cycle
+    vxc.vj = vj
+    vxc.vk = vk
     return vxc
 
 def energy_elec(ks, dm=None, h1e=None, vhf=None):
@@ -64,3 +64,23 @@ def test_rks_nuc_grad_nlc(get_mol):
     mf.nlc = 'VV10'
     g = mf.energy_grad(mode="rev").coords
     assert abs(g[1,2] - 2.68791294e-03) < 1e-9
+
+def test_rks_nuc_grad_rsh(get_mol, get_mol_p, get_mol_m):
+    # range-separated hybrid
+    mol = get_mol
+    mf = dft.RKS(mol)
+    mf.xc = 'camb3lyp'
+    g = mf.energy_grad(mode="rev").coords
+
+    molp = get_mol_p
+    mfp = dft.RKS(molp)
+    mfp.xc = 'camb3lyp'
+    ep = mfp.kernel()
+
+    molm = get_mol_m
+    mfm = dft.RKS(molm)
+    mfm.xc = 'camb3lyp'
+    em = mfm.kernel()
+
+    g_fd = (ep-em) / 1e-4 * BOHR
+    assert abs(g[1,2] - g_fd) < 3e-6
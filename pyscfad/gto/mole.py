@@ -53,6 +53,14 @@ def _rr_jvp(primals, tangents):
     tangent_out += tangent_out.T
     return primal_out, tangent_out
 
+def _env_signature(mol, env):
+    '''
+    Signature of ``_env`` by value. The coordinates are kept, because
+    the integral primals are computed by libcint from ``_env``
+    at trace time.
+    '''
+    return numpy.asarray(env).tobytes()
+
 @lib.dataclass
 class Mole(gto.Mole):
     # traced attributes
@@ -76,7 +84,8 @@ class Mole(gto.Mole):
     symmetry: bool = False
     symmetry_subgroup: Optional[str] = None
     cart: bool = False
-    atom: Union[list,str] = lib.field(default_factory = list)
+    # the geometry is given by coords or _env
+    atom: Union[list,str] = lib.field(default_factory = list, signature=False)
     basis: Union[dict,str] = 'sto-3g'
     nucmod: Union[dict,str] = lib.field(default_factory = dict)
     ecp: Union[dict,str] = lib.field(default_factory = dict)
@@ -85,7 +94,8 @@ class Mole(gto.Mole):
     # private attributes
     _atm: numpy.ndarray = numpy.zeros((0,6), dtype=numpy.int32)
     _bas: numpy.ndarray = numpy.zeros((0,8), dtype=numpy.int32)
-    _env: numpy.ndarray = numpy.zeros(PTR_ENV_START)
+    _env: numpy.ndarray = lib.field(default=numpy.zeros(PTR_ENV_START),
+                                    signature=_env_signature)
     _ecpbas: numpy.ndarray = numpy.zeros((0,8), dtype=numpy.int32)
 
     stdout: Any = sys.stdout
@@ -98,8 +108,8 @@ class Mole(gto.Mole):
     _symm_axes: Optional[numpy.ndarray] = None
     _nelectron: Optional[int] = None
     _nao: Optional[int] = None
-    _enuc: Optional[float] = None
-    _atom: list = lib.field(default_factory = list)
+    _enuc: Optional[float] = lib.field(default=None, signature=False)
+    _atom: list = lib.field(default_factory = list, signature=False)
     _basis: dict = lib.field(default_factory = dict)
     _ecp: dict = lib.field(default_factory = dict)
     _built: bool = False
@@ -1,7 +1,9 @@
 from functools import partial
+from contextlib import contextmanager
 import ctypes
 import numpy
 from jax import vmap
+from jax import core
 from jax import custom_jvp
 from jax import jit
 from jax.lax import dynamic_slice, dynamic_update_slice
@@ -18,6 +20,34 @@ libcgto = load_library('libcgto')
 
 SET_RC = ["rinv",]
 
+# primal integrals to be reused by getints4c, see primal_cache
+_PRIMAL_CACHE = {}
+
+def cache_key(mol, intor, comp=None, aosym='s1'):
+    '''
+    Key identifying the integrals of a given geometry and basis set.
+    Range-separation parameters are included through ``mol._env``.
+    '''
+    intor = mol._add_suffix(intor)
+    return (intor, comp, aosym, mol._atm.tobytes(), mol._bas.tobytes(),
+            numpy.asarray(mol._env).tobytes())
+
+@contextmanager
+def primal_cache(cache):
+    '''
+    Within this context, getints4c returns the integrals in ``cache``,
+    a dict built with :func:`cache_key`, instead of recomputing them.
+    Only the derivative integrals are then computed in the JVP.
+    '''
+    cache = {key: ints for key, ints in cache.items()
+             if ints is not None and not isinstance(ints, core.Tracer)}
+    _PRIMAL_CACHE.update(cache)
+    try:
+        yield
+    finally:
+        for key in cache:
+            _PRIMAL_CACHE.pop(key, None)
+
 def getints(mol, intor, shls_slice=None,
             comp=None, hermi=0, aosym='s1', out=None):
     if intor.endswith("_spinor"):
@@ -136,6 +166,11 @@ def getints2c_jvp(intor, shls_slice, comp, hermi, aosym, out,
 @partial(custom_jvp, nondiff_argnums=tuple(range(1,6)))
 def getints4c(mol, intor,
               shls_slice=None, comp=None, aosym='s1', out=None):
+    if _PRIMAL_CACHE and shls_slice is None and out is None:
+        eri = _PRIMAL_CACHE.get(cache_key(mol, intor, comp, aosym))
+        if eri is not None:
+            return eri
+
     if (shls_slice is None and aosym=='s1'
             and intor in ['int2e', 'int2e_sph', 'int2e_cart']):
         eri8 = Mole.intor(mol, intor, comp=comp, aosym='s8',
@@ -0,0 +1,28 @@
+import jax
+from pyscfad import gto
+
+def _make_mol(r):
+    mol = gto.Mole()
+    mol.atom = f'H 0 0 0; H 0 0 {r}'  # in Angstrom
+    mol.basis = '631g'
+    mol.verbose = 0
+    mol.build(trace_coords=True)
+    return mol
+
+def test_jit_cache():
+    ntrace = []
+    @jax.jit
+    def func(mol):
+        ntrace.append(1)
+        return mol.intor('int1e_ovlp')
+
+    # same geometry, different Mole objects
+    s1 = func(_make_mol(0.74))
+    func(_make_mol(0.74))
+    assert len(ntrace) == 1
+
+    mol = _make_mol(0.75)
+    s2 = func(mol)
+    assert abs(s2 - mol.intor('int1e_ovlp')).max() < 1e-12
+    assert abs(s1 - _make_mol(0.74).intor('int1e_ovlp')).max() < 1e-12
+    assert abs(s1 - s2).max() > 1e-4
@@ -0,0 +1,83 @@
+'''
+DIIS on JAX arrays
+
+Unlike :class:`pyscf.lib.diis.DIIS`, the history is kept in a fixed-size
+ring buffer carried as a pytree, so that the extrapolation can be used
+inside ``jit`` and ``lax.while_loop``.
+'''
+from typing import NamedTuple
+import jax
+from pyscfad.lib import numpy as np
+from pyscfad.lib import ops
+
+class DIISState(NamedTuple):
+    vecs: np.ndarray
+    errs: np.ndarray
+    head: int
+    count: int
+
+class DIIS:
+    '''
+    Args:
+        space : int
+            Size of the ring buffer.
+        min_space : int
+            Number of stored vectors before the extrapolation starts.
+        stop_gradient : bool
+            If True, the extrapolation coefficients are excluded from
+            the gradient path.
+
+    Examples:
+
+    >>> adiis = DIIS(space=6)
+    >>> state = adiis.init(x0)
+    >>> state, x = adiis.update(state, x, xerr)
+    '''
+    def __init__(self, space=6, min_space=1, stop_gradient=True):
+        self.space = space
+        self.min_space = min_space
+        self.stop_gradient = stop_gradient
+
+    def init(self, x):
+        x = np.ravel(x)
+        vecs = np.zeros((self.space, x.size), dtype=x.dtype)
+        return DIISState(vecs, np.zeros_like(vecs), 0, 0)
+
+    def update(self, state, x, xerr):
+        shape = x.shape
+        x = np.ravel(x)
+        xerr = np.ravel(xerr)
+        vecs = ops.index_update(state.vecs, state.head, x)
+        errs = ops.index_update(state.errs, state.head, xerr)
+        head = (state.head + 1) % self.space
+        count = np.minimum(state.count + 1, self.space)
+        state = DIISState(vecs, errs, head, count)
+
+        c = self.coefficients(errs, count)
+        if self.stop_gradient:
+            c = jax.lax.stop_gradient(c)
+        xnew = np.where(count >= self.min_space, np.dot(c, vecs), x)
+        return state, xnew.reshape(shape)
+
+    def coefficients(self, errs, count):
+        '''
+        Solve the DIIS equations. Empty slots of the buffer
+        get vanishing coefficients.
+        '''
+        space = self.space
+        valid = np.arange(space) < count
+        mask = valid[:,None] & valid[None,:]
+        b = np.dot(errs.conj(), errs.T).real
+        b = np.where(mask, b, 0)
+        # scale to improve the condition number
+        scale = np.max(np.abs(np.diag(b)))
+        b = b / np.where(scale > 0, scale, 1.)
+        b = b + np.diag(np.where(valid, 0., 1.))
+
+        h = np.zeros((space+1, space+1), dtype=b.dtype)
+        h = ops.index_update(h, ops.index[0,1:], valid)
+        h = ops.index_update(h, ops.index[1:,0], valid)
+        h = ops.index_update(h, ops.index[1:,1:], b)
+        g = ops.index_update(np.zeros(space+1, dtype=b.dtype), 0, 1.)
+        c = np.linalg.lstsq(h, g)[0]
+        return c[1:]
@@ -3,32 +3,87 @@ Extensions to dataclasses
 """
 
 import dataclasses
+import numpy
 import jax
 from jax import tree_util
 
 stop_grad = jax.lax.stop_gradient
 
+# numpy arrays larger than this are compared by identity in the signature
+SIGNATURE_MAX_SIZE = 4096
+
+class StaticData:
+    '''
+    Auxiliary data of a dataclass pytree.
+    Only the hashable ``signature`` is compared and hashed (e.g., by the
+    jit cache), while the ``values`` are carried along without hashing.
+    '''
+    __slots__ = ('signature', 'values')
+
+    def __init__(self, signature, values):
+        self.signature = signature
+        self.values = values
+
+    def __hash__(self):
+        return hash(self.signature)
+
+    def __eq__(self, other):
+        return (isinstance(other, StaticData) and
+                self.signature == other.signature)
+
+    def __repr__(self):
+        return f'StaticData({self.signature!r})'
+
+def _signature(value):
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, type)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_signature(v) for v in value)
+    if isinstance(value, dict):
+        return ('dict',) + tuple((k, _signature(v)) for k, v in value.items())
+    if isinstance(value, numpy.ndarray) and value.size <= SIGNATURE_MAX_SIZE:
+        return ('ndarray', value.shape, value.dtype.str, value.tobytes())
+    if hasattr(value, 'shape') and hasattr(value, 'dtype'):
+        # large or device arrays and tracers
+        return ('id', id(value))
+    try:
+        hash(value)
+    except TypeError:
+        return ('id', id(value))
+    return value
+
 def dataclass(cls):
     data_cls = dataclasses.dataclass()(cls)
     data_fields = []
     meta_fields = []
+    meta_signatures = []
     for field_name, field_info in data_cls.__dataclass_fields__.items():
         is_pytree_node = field_info.metadata.get('pytree_node', False)
         if is_pytree_node:
             data_fields.append(field_name)
         else:
             meta_fields.append(field_name)
+            meta_signatures.append(field_info.metadata.get('signature', True))
 
     def tree_flatten(obj):
         data =  tuple(getattr(obj, key, "None") for key in data_fields)
         meta =  tuple(getattr(obj, key, "None") for key in meta_fields)
-        return data, meta
+        signature = []
+        for key, val, sig in zip(meta_fields, meta, meta_signatures):
+            if sig is True:
+                signature.append((key, _signature(val)))
+            elif callable(sig):
+                signature.append((key, sig(obj, val)))
+        return data, StaticData(tuple(signature), meta)
 
-    def tree_unflatten(meta, data):
-        data_args = tuple(zip(data_fields, data))
-        meta_args = tuple(zip(meta_fields, meta))
-        kwargs = dict(data_args + meta_args)
-        obj = data_cls(**kwargs)
+    def tree_unflatten(static, data):
+        meta = static.values
+        # NOTE bypass __init__ and __post_init__, which can be expensive
+        # (e.g., creating chkfiles) and are called many times by jax transforms
+        obj = object.__new__(data_cls)
+        obj.__dict__.update(zip(data_fields, data))
+        obj.__dict__.update(zip(meta_fields, meta))
+        obj._keys = set(obj.__dict__.keys())
         return obj
 
     tree_util.register_pytree_node(data_cls,
@@ -36,5 +91,15 @@ def dataclass(cls):
                                    tree_unflatten)
     return data_cls
 
-def field(pytree_node=False, **kwargs):
-    return dataclasses.field(metadata={'pytree_node': pytree_node}, **kwargs)
+def field(pytree_node=False, signature=True, **kwargs):
+    '''
+    Args:
+        pytree_node : bool
+            Whether the field is a pytree node (traced) or static data.
+        signature : bool or callable
+            How a static field enters the hashable signature of the
+            auxiliary data. If False, the field is excluded; if callable,
+            ``signature(obj, value)`` returns the hashable token.
+    '''
+    metadata = {'pytree_node': pytree_node, 'signature': signature}
+    return dataclasses.field(metadata=metadata, **kwargs)
@@ -0,0 +1,29 @@
+import numpy
+import jax
+from pyscfad.lib import numpy as np
+from pyscfad.lib import diis
+
+def test_diis():
+    numpy.random.seed(1)
+    n = 10
+    a = numpy.random.rand(n,n)
+    a = .9 * a / numpy.linalg.norm(a, 2)
+    b = numpy.random.rand(n)
+    x_ref = numpy.linalg.solve(numpy.eye(n)-a, b)
+
+    adiis = diis.DIIS(space=6)
+    def body(carry):
+        cycle, x, _, state = carry
+        xnew = np.dot(a, x) + b
+        state, xnew = adiis.update(state, xnew, xnew-x)
+        return cycle+1, xnew, np.linalg.norm(xnew-x), state
+
+    def cond(carry):
+        cycle, _, err, _ = carry
+        return (cycle < 50) & (err > 1e-10)
+
+    x0 = np.zeros(n)
+    carry = (0, x0, np.inf, adiis.init(x0))
+    cycle, x, _, _ = jax.jit(lambda c: jax.lax.while_loop(cond, body, c))(carry)
+    assert cycle < 50
+    assert abs(x - x_ref).max() < 1e-8
@@ -0,0 +1,34 @@
+import jax
+from pyscfad import lib
+from pyscfad.lib import numpy as np
+
+@lib.dataclass
+class Foo():
+    x: np.array = lib.field(pytree_node=True, default=None)
+    n: int = 0
+
+    def __post_init__(self):
+        self.n += 1
+
+def test_tree_unflatten():
+    foo = Foo(np.ones(3))
+    assert foo.n == 1
+    leaves, treedef = jax.tree_util.tree_flatten(foo)
+    foo1 = jax.tree_util.tree_unflatten(treedef, leaves)
+    assert foo1.n == 1
+    assert abs(foo1.x - foo.x).max() == 0
+
+    g = jax.grad(lambda foo: (foo.x**2).sum())(foo)
+    assert g.n == 1
+    assert abs(g.x - 2*foo.x).max() < 1e-12
+
+def test_static_signature():
+    foo1 = Foo(np.ones(3), n=2)
+    foo2 = Foo(np.zeros(3), n=2)
+    foo3 = Foo(np.zeros(3), n=3)
+    treedef1 = jax.tree_util.tree_structure(foo1)
+    treedef2 = jax.tree_util.tree_structure(foo2)
+    treedef3 = jax.tree_util.tree_structure(foo3)
+    assert treedef1 == treedef2
+    assert hash(treedef1) == hash(treedef2)
+    assert treedef1 != treedef3
@@ -1,2 +1,4 @@
 from pyscfad.mp import mp2
 from pyscfad.mp.mp2 import MP2
+from pyscfad.mp import oomp2
+from pyscfad.mp.oomp2 import OOMP2
@@ -1,11 +1,265 @@
 from typing import Union, Any
+import copy
+from functools import partial, reduce
 import numpy
 import jax
+from jax.scipy.sparse.linalg import cg
 from pyscf import __config__
+from pyscf.lib import logger, current_memory, prange
 from pyscf.mp import mp2
 from pyscfad import lib, gto
+from pyscfad import ao2mo
 from pyscfad.lib import numpy as jnp
+from pyscfad.lib import ops, stop_grad
+from pyscfad.lib import linalg_helper
+from pyscfad.gto import moleintor
 from pyscfad.scf import hf
+from pyscfad.scf import newton
+from pyscfad.tools import rotate_mo1
+
+def kernel_batched(mp, mo_energy=None, mo_coeff=None, verbose=None):
+    '''
+    MP2 correlation energy without storing the ovov integrals.
+
+    The (ia|jb) integrals are generated for blocks of the occupied index i,
+    and each block is checkpointed, so that reverse-mode AD recomputes the
+    block instead of keeping it (and its residuals) in memory.
+    The AO integrals and their derivatives are generated for blocks of shells
+    (see :func:`_ovov_block`), so that no nao**4 tensor is held either.
+    This path is taken by ``MP2.kernel(with_t2=False)``.
+    '''
+    log = logger.new_logger(mp, verbose)
+    eris = mp2._ChemistsERIs()
+    eris._common_init_(mp, mo_coeff)
+    mo_coeff = eris.mo_coeff
+    if mo_energy is None:
+        mo_energy = eris.mo_energy
+
+    mol = mp.mol
+    nocc = mp.nocc
+    nao = mo_coeff.shape[0]
+    nvir = mo_coeff.shape[1] - nocc
+    co = jnp.asarray(mo_coeff[:,:nocc])
+    cv = jnp.asarray(mo_coeff[:,nocc:])
+    eo = mo_energy[:nocc]
+    ev = mo_energy[nocc:]
+
+    max_memory = max(0, mp.max_memory - current_memory()[0])
+    blksize = int(min(nocc, max(1, max_memory*.5e6/8/(3*nocc*nvir**2))))
+    # eri and the half-transformed integrals; int2e_ip1 and the AO density
+    blksize_ao = int(max(1, max_memory*.5e6/8/(nao**3*2)))
+    ao_blocks = (ao2mo.outcore.AOBlocks(mol, blksize_ao),
+                 ao2mo.outcore.AOBlocks(mol, max(1, blksize_ao//4), 'int2e_ip1', 3))
+    log.debug1('max_memory %d MB, blksize = %d, blksize_ao = %d',
+               max_memory, blksize, blksize_ao)
+
+    @jax.checkpoint
+    def block_energy(mol, co, cv, ci, ei):
+        g = _ovov_block(mol, co, cv, ci, ao_blocks)
+        d = ei[:,None,None,None] - ev[None,:,None,None] + eo[None,None,:,None] - ev
+        t2 = g.conj() / d
+        return (2*jnp.einsum('iajb,iajb', t2, g)
+                - jnp.einsum('iajb,ibja', t2, g)).real
+
+    emp2 = 0
+    for i0, i1 in prange(0, nocc, blksize):
+        emp2 += block_energy(mol, co, cv, co[:,i0:i1], eo[i0:i1])
+    return emp2
+
+def _transform(eri, mo_coeffs, order, trans=False):
+    '''
+    Transform the indices of eri by mo_coeffs in the given order,
+    with C_pi (or C_pi^T if trans) for each index.
+    '''
+    for k in order:
+        eri = jnp.tensordot(eri, mo_coeffs[k], axes=((k,), (int(trans),)))
+        eri = jnp.moveaxis(eri, -1, k)
+    return eri
+
+def _ovov_block(mol, co, cv, ci, ao_blocks):
+    '''
+    (ia|jb) with i in the block of orbitals ci. The AO integrals are
+    computed for blocks of shells of the first index by ``ao_blocks``,
+    a pair of :class:`ao2mo.outcore.AOBlocks` for ``int2e`` and ``int2e_ip1``.
+
+    Only the derivatives wrt the nuclear coordinates are implemented,
+    as for :func:`pyscfad.pbc.gto._pbcintor._pbc_intor_rev`;
+    the basis set parameters get zero cotangents.
+    '''
+    return _ovov_block_rev(mol, co, cv, ci, ao_blocks)
+
+@partial(jax.custom_vjp, nondiff_argnums=(4,))
+def _ovov_block_rev(mol, co, cv, ci, ao_blocks):
+    g = 0
+    for p0, p1, eri in ao_blocks[0]:
+        g += _transform(eri, (ci[p0:p1], cv, co, cv), (3,2,1,0))
+    return g
+
+def _ovov_block_fwd(mol, co, cv, ci, ao_blocks):
+    return _ovov_block_rev(mol, co, cv, ci, ao_blocks), (mol, co, cv, ci)
+
+def _ovov_block_bwd(ao_blocks, res, g_bar):
+    mol, co, cv, ci = res
+    ci_bar = []
+    co_bar = 0
+    cv_bar = 0
+    for p0, p1, eri in ao_blocks[0]:
+        _, vjp = jax.vjp(lambda ci, co, cv, eri=eri:
+                         _transform(eri, (ci, cv, co, cv), (3,2,1,0)),
+                         ci[p0:p1], co, cv)
+        ci_blk, co_blk, cv_blk = vjp(g_bar)
+        ci_bar.append(ci_blk)
+        co_bar += co_blk
+        cv_bar += cv_blk
+    ci_bar = jnp.concatenate(ci_bar, axis=0)
+
+    mol_bar = jax.tree_util.tree_map(jnp.zeros_like, mol)
+    if mol.coords is not None:
+        # sum_pqrs d(pq|rs)/dR gamma_pqrs, with the AO density
+        # gamma_pqrs = sum_iajb g_bar_iajb C_pi C_qa C_rj C_sb
+        # generated for the same blocks as (nabla p q|rs) in each index
+        mo_coeffs = (ci, cv, co, cv)
+        de = []
+        for p0, p1, eri1 in ao_blocks[1]:
+            gamma = 0
+            for k, axes in enumerate(((0,1,2,3), (1,0,2,3), (2,3,0,1), (3,2,0,1))):
+                c = list(mo_coeffs)
+                c[k] = c[k][p0:p1]
+                order = (k,) + tuple(i for i in range(4) if i != k)
+                gamma += _transform(g_bar, c, order, trans=True).transpose(axes)
+            de.append(jnp.einsum('xpqrs,pqrs->px', eri1, gamma))
+            gamma = None
+        de = jnp.concatenate(de, axis=0)
+        aoslices = mol.aoslice_by_atom()
+        mol_bar.coords = -jnp.stack([de[p0:p1].sum(axis=0)
+                                     for p0, p1 in aoslices[:,2:]])
+    return mol_bar, co_bar, cv_bar, ci_bar
+
+_ovov_block_rev.defvjp(_ovov_block_fwd, _ovov_block_bwd)
+
+def _rotate_mo(mf, mo_coeff, idx, x):
+    '''
+    MO coefficients rotated by the occupied-virtual parameters x,
+    and orthonormalized with the overlap of mf.mol.
+    The orthonormalization is exact to first order in the geometry,
+    which is all the gradient needs.
+    '''
+    nmo = mo_coeff.shape[1]
+    s = reduce(jnp.dot, (mo_coeff.T, mf.get_ovlp(), mo_coeff))
+    mo_coeff = jnp.dot(mo_coeff, 1.5*jnp.eye(nmo) - .5*s)
+    x = ops.index_update(jnp.zeros(nmo*(nmo+1)//2, dtype=x.dtype), idx, x)
+    return rotate_mo1(mo_coeff, x)
+
+def _energy_hf(mf, mo_coeff, mo_occ, h1e):
+    dm = mf.make_rdm1(mo_coeff, mo_occ)
+    vhf = mf.get_veff(mf.mol, dm)
+    return mf.energy_tot(dm, h1e, vhf)
+
+def _energy_corr(mf, mo_coeff, mo_occ, h1e):
+    '''
+    MP2 correlation energy in the semicanonical orbitals,
+    which is invariant to occupied-occupied and virtual-virtual rotations.
+    '''
+    t2, g = _make_t2_semicanonical(mf, mo_coeff, mo_occ, h1e)[:2]
+    return 2*jnp.einsum('iajb,iajb', t2, g) - jnp.einsum('iajb,ibja', t2, g)
+
+def _make_t2_semicanonical(mf, mo_coeff, mo_occ, h1e):
+    '''
+    t2[i,a,j,b] and (ia|jb) in the semicanonical orbitals, and the
+    occupied and virtual rotations uo, uv from mo_coeff to them.
+    '''
+    nocc = int(numpy.count_nonzero(numpy.asarray(mo_occ) > 0))
+    dm = mf.make_rdm1(mo_coeff, mo_occ)
+    fock = h1e + mf.get_veff(mf.mol, dm)
+    co = mo_coeff[:,:nocc]
+    cv = mo_coeff[:,nocc:]
+    eo, uo = linalg_helper.eigh(reduce(jnp.dot, (co.T, fock, co)))
+    ev, uv = linalg_helper.eigh(reduce(jnp.dot, (cv.T, fock, cv)))
+    co = jnp.dot(co, uo)
+    cv = jnp.dot(cv, uv)
+    eri = mf._eri
+    if eri is None:
+        eri = mf.mol.intor('int2e', aosym='s1')
+    g = ao2mo.incore.general(eri, (co,cv,co,cv))
+    d = eo[:,None,None,None] - ev[None,:,None,None] + eo[None,None,:,None] - ev
+    t2 = g / d
+    return t2, g, uo, uv
+
+def _lagrangian(mf, mo_coeff, mo_occ, z, h1e=None):
+    '''
+    E_HF + E_MP2 + z . dE_HF/dx at x = 0
+    '''
+    if h1e is None:
+        h1e = mf.get_hcore()
+    idx = newton.get_rotation_index(mo_occ)
+    x0 = jnp.zeros(len(idx))
+    def e_hf(x):
+        return _energy_hf(mf, _rotate_mo(mf, mo_coeff, idx, x), mo_occ, h1e)
+    e_tot, e_z = jax.jvp(e_hf, (x0,), (z,))
+    e_tot += _energy_corr(mf, _rotate_mo(mf, mo_coeff, idx, x0), mo_occ, h1e)
+    return e_tot + e_z
+
+def solve_zvector(mp, mf=None):
+    '''
+    Solve the orbital Z-vector equations H z = -dE_MP2/dx with the
+    converged SCF. The orbital Hessian-vector products are computed by
+    AD of the SCF energy with respect to the rotation parameters x.
+    '''
+    if mf is None:
+        mf = mp._scf
+    mf = stop_grad(mf)
+    mo_coeff = mf.mo_coeff
+    mo_occ = mf.mo_occ
+    h1e = mf.get_hcore()
+    idx = newton.get_rotation_index(mo_occ)
+    x0 = jnp.zeros(len(idx))
+    def e_hf(x):
+        return _energy_hf(mf, _rotate_mo(mf, mo_coeff, idx, x), mo_occ, h1e)
+    def e_corr(x):
+        return _energy_corr(mf, _rotate_mo(mf, mo_coeff, idx, x), mo_occ, h1e)
+
+    g = jax.grad(e_corr)(x0)
+    _, hop = jax.linearize(jax.grad(e_hf), x0)
+    p, q = numpy.triu_indices(len(mo_occ))
+    mo_energy = mf.mo_energy
+    hdiag = 4. * abs(mo_energy[q[idx]] - mo_energy[p[idx]])
+    hdiag = jnp.where(hdiag < 1e-2, 1e-2, hdiag)
+    z, _ = cg(hop, -g, M=lambda v: v / hdiag, tol=mp.conv_tol_normt,
+              maxiter=mp.max_cycle)
+    return z
+
+def energy_grad(mp):
+    '''
+    MP2 energy gradient wrt AO parameters from the orbital Z-vector
+    Lagrangian. Neither the SCF nor the MP2 iterations are traced;
+    the cost is a few times that of the MP2 energy.
+    '''
+    if mp.frozen:
+        raise NotImplementedError('frozen orbitals')
+    # the integrals of the caller's SCF object are kept
+    mf = copy.copy(mp._scf)
+    z = solve_zvector(mp, mf)
+    mo_coeff = stop_grad(mf.mo_coeff)
+    mo_occ = mf.mo_occ
+    # the cached ERIs are reused as the primal output
+    eri_cache = mf._eri_primal_cache()
+    mf.reset()
+    with moleintor.primal_cache(eri_cache):
+        jac = jax.grad(_lagrangian)(mf, mo_coeff, mo_occ, z)
+    return jac.mol
+
+def make_rdm1_relaxed(mp):
+    '''
+    Relaxed HF + MP2 one-particle density matrix in the AO basis,
+    the derivative of the Lagrangian wrt the core Hamiltonian.
+    '''
+    if mp.frozen:
+        raise NotImplementedError('frozen orbitals')
+    mf = stop_grad(mp._scf)
+    z = solve_zvector(mp, mf)
+    h1e = mf.get_hcore()
+    dm = jax.grad(lambda h1e: _lagrangian(mf, mf.mo_coeff, mf.mo_occ, z, h1e))(h1e)
+    return .5 * (dm + dm.T)
 
 @lib.dataclass
 class MP2(mp2.MP2):
@@ -47,6 +301,30 @@ class MP2(mp2.MP2):
 
         self._keys = set(self.__dict__.keys())
 
+    def kernel(self, mo_energy=None, mo_coeff=None, eris=None, with_t2=mp2.WITH_T2):
+        '''
+        The energy is computed by :func:`kernel_batched`, which also keeps
+        the memory of the gradient low, only if ``with_t2=False``
+        (and without eris and density fitting). By default, t2 is kept
+        and the PySCF kernel is used.
+        '''
+        if (eris is not None or with_t2
+                or getattr(self._scf, 'with_df', None) is not None):
+            return mp2.MP2.kernel(self, mo_energy, mo_coeff, eris, with_t2)
+
+        self.dump_flags()
+        self.e_hf = self._scf.e_tot
+        self.e_corr = kernel_batched(self, mo_energy, mo_coeff)
+        self.t2 = None
+        self._finalize()
+        return self.e_corr, self.t2
+
+    def energy_grad(self):
+        return energy_grad(self)
+
+    def make_rdm1_relaxed(self):
+        return make_rdm1_relaxed(self)
+
     def ao2mo(self, mo_coeff=None):
         eris = mp2._ChemistsERIs()
         eris._common_init_(self, mo_coeff)
@@ -55,5 +333,12 @@ class MP2(mp2.MP2):
         nocc = self.nocc
         co = jnp.asarray(mo_coeff[:,:nocc])
         cv = jnp.asarray(mo_coeff[:,nocc:])
-        eris.ovov = jnp.einsum("uvst,ui,va,sj,tb->iajb", self._scf._eri, co,cv,co,cv)
+        with_df = getattr(self._scf, 'with_df', None)
+        if with_df is not None:
+            cderi = ao2mo.incore.get_cderi(with_df, self.mol)
+            ovL = ao2mo.incore.general_df(cderi, (co,cv))
+            eris.ovov = jnp.einsum('iaL,jbL->iajb', ovL, ovL)
+        else:
+            eris.ovov = ao2mo.incore.general(self._scf._eri, (co,cv,co,cv),
+                                             max_memory=self.max_memory)
         return eris
@@ -0,0 +1,168 @@
+'''
+Orbital-optimized MP2
+
+The energy is minimized with respect to the occupied-virtual orbital
+rotations by a quasi-Newton (BFGS) method, with the inverse Hessian
+initialized from the diagonal orbital Hessian.
+The AO integrals stay resident, and after each step the reference
+orbitals are updated, so that only small rotations are applied.
+'''
+from typing import Optional
+import copy
+from functools import reduce
+import numpy
+import jax
+from pyscf.lib import logger
+from pyscfad import lib
+from pyscfad.lib import numpy as jnp
+from pyscfad.lib import ops, stop_grad
+from pyscfad.gto import moleintor
+from pyscfad.scf import newton
+from pyscfad.tools import rotate_mo1
+from pyscfad.mp import mp2
+
+def gen_energy(mf, mo_occ, h1e=None):
+    '''
+    OO-MP2 energy as a function of the reference orbitals and
+    the non-redundant rotation parameters.
+    '''
+    if h1e is None:
+        h1e = mf.get_hcore()
+    nmo = len(mo_occ)
+    ntriu = nmo * (nmo+1) // 2
+    idx = newton.get_rotation_index(mo_occ)
+    def energy(mo_coeff, x):
+        x = ops.index_update(jnp.zeros(ntriu, dtype=x.dtype), idx, x)
+        mo = rotate_mo1(mo_coeff, x)
+        return (mp2._energy_hf(mf, mo, mo_occ, h1e) +
+                mp2._energy_corr(mf, mo, mo_occ, h1e))
+    return energy
+
+def _hdiag(mf, mo_coeff, mo_occ, h1e, idx):
+    dm = mf.make_rdm1(mo_coeff, mo_occ)
+    fock = h1e + mf.get_veff(mf.mol, dm)
+    fdiag = jnp.einsum('pi,pq,qi->i', mo_coeff, fock, mo_coeff)
+    p, q = numpy.triu_indices(len(mo_occ))
+    hdiag = 4. * abs(fdiag[q[idx]] - fdiag[p[idx]])
+    return jnp.where(hdiag < 1e-2, 1e-2, hdiag)
+
+def kernel(mymp, mo_coeff=None, conv_tol=None, conv_tol_grad=None,
+           max_cycle=None, verbose=None):
+    '''
+    Args:
+        mo_coeff : initial orbitals, e.g. from a previous geometry.
+            Default is ``mymp.mo_coeff``.
+
+    Returns:
+        converged, e_tot, mo_coeff
+    '''
+    log = logger.new_logger(mymp, verbose)
+    cput0 = (logger.process_clock(), logger.perf_counter())
+    if conv_tol is None:
+        conv_tol = mymp.conv_tol
+    if conv_tol_grad is None:
+        conv_tol_grad = numpy.sqrt(conv_tol)
+    if max_cycle is None:
+        max_cycle = mymp.max_cycle
+
+    mf = stop_grad(mymp._scf)
+    if mf._eri is None:
+        mf._eri = mf.mol.intor('int2e', aosym='s1')
+    if mo_coeff is None:
+        mo_coeff = mymp.mo_coeff
+    mo_coeff = stop_grad(mo_coeff)
+    mo_occ = mf.mo_occ
+    h1e = mf.get_hcore()
+    idx = newton.get_rotation_index(mo_occ)
+    nmo = len(mo_occ)
+    ntriu = nmo * (nmo+1) // 2
+
+    value_and_grad = jax.value_and_grad(gen_energy(mf, mo_occ, h1e), argnums=1)
+    x0 = jnp.zeros(len(idx))
+    e_tot, g = value_and_grad(mo_coeff, x0)
+    log.info('init E(OO-MP2) = %.15g  |g|= %4.3g', e_tot, jnp.linalg.norm(g))
+    hinv = jnp.diag(1. / _hdiag(mf, mo_coeff, mo_occ, h1e, idx))
+    conv = False
+    de = None
+    for cycle in range(max_cycle):
+        norm_g = jnp.linalg.norm(g)
+        if norm_g < conv_tol_grad and (de is None or abs(de) < conv_tol):
+            conv = True
+            break
+
+        dx = -jnp.dot(hinv, g)
+        if jnp.dot(g, dx) >= 0:
+            # not a descent direction, restart from the diagonal Hessian
+            hinv = jnp.diag(1. / _hdiag(mf, mo_coeff, mo_occ, h1e, idx))
+            dx = -jnp.dot(hinv, g)
+        step = 1.
+        while True:
+            e_new, g_new = value_and_grad(mo_coeff, step*dx)
+            if e_new <= e_tot + 1e-4 * step * jnp.dot(g, dx) or step < .1:
+                break
+            step *= .5
+            log.debug('line search, step = %.3g', step)
+
+        # BFGS update of the inverse Hessian
+        s = step * dx
+        y = g_new - g
+        sy = jnp.dot(s, y)
+        if sy > 1e-12:
+            rho = 1. / sy
+            a = jnp.eye(len(s)) - rho * jnp.outer(s, y)
+            hinv = reduce(jnp.dot, (a, hinv, a.T)) + rho * jnp.outer(s, s)
+
+        # move the reference orbitals, the gradient is carried over
+        # to the rotated frame to first order
+        mo_coeff = rotate_mo1(mo_coeff, ops.index_update(jnp.zeros(ntriu), idx, s))
+        de = e_new - e_tot
+        e_tot, g = e_new, g_new
+        log.info('cycle %d  E(OO-MP2) = %.15g  dE = %4.3g  |g|= %4.3g',
+                 cycle+1, e_tot, de, jnp.linalg.norm(g))
+
+    log.timer('OO-MP2', *cput0)
+    if conv:
+        log.note('OO-MP2 converged, E = %.15g', e_tot)
+    else:
+        log.note('OO-MP2 not converged, E = %.15g', e_tot)
+    return conv, e_tot, mo_coeff
+
+@lib.dataclass
+class OOMP2(mp2.MP2):
+    converged: bool = False
+    conv_tol_grad: Optional[float] = None
+
+    def kernel(self, mo_coeff=None):
+        '''
+        Returns:
+            e_corr, and t2[i,j,a,b] in the optimized orbitals ``self.mo_coeff``
+        '''
+        self.dump_flags()
+        self.converged, e_tot, self.mo_coeff = \
+                kernel(self, mo_coeff, self.conv_tol, self.conv_tol_grad,
+                       self.max_cycle, self.verbose)
+        mf = stop_grad(self._scf)
+        dm = mf.make_rdm1(self.mo_coeff, mf.mo_occ)
+        self.e_hf = mf.energy_tot(dm)
+        self.e_corr = e_tot - self.e_hf
+        # the orbitals are not canonical, t2 is rotated back
+        # from the semicanonical ones
+        t2, _, uo, uv = mp2._make_t2_semicanonical(mf, self.mo_coeff, mf.mo_occ,
+                                                   mf.get_hcore())
+        self.t2 = jnp.einsum('iajb,Ii,Aa,Jj,Bb->IJAB', t2, uo, uv, uo, uv)
+        return self.e_corr, self.t2
+
+    def energy_grad(self):
+        '''
+        Energy gradient wrt AO parameters. The OO-MP2 energy is stationary
+        with respect to the orbital rotations, so no Z-vector is needed.
+        '''
+        # the integrals of the caller's SCF object are kept
+        mf = copy.copy(self._scf)
+        mo_occ = mf.mo_occ
+        z = jnp.zeros(len(newton.get_rotation_index(mo_occ)))
+        eri_cache = mf._eri_primal_cache()
+        mf.reset()
+        with moleintor.primal_cache(eri_cache):
+            jac = jax.grad(mp2._lagrangian)(mf, stop_grad(self.mo_coeff), mo_occ, z)
+        return jac.mol
@@ -2,6 +2,8 @@ import pytest
 import numpy
 import jax
 import pyscf
+from pyscf import df as pyscf_df
+from pyscf.mp import dfmp2
 from pyscfad import gto, scf, mp
 
 @pytest.fixture
@@ -35,3 +37,54 @@ def test_nuc_grad(get_mol0, get_mol):
                         [0, 3.79148621e-02, -4.74552207e-02],
                         [0, -3.79148621e-02, -4.74552207e-02]])
     assert abs(g-g0).max() < 2e-6
+
+def test_nuc_grad_batched(get_mol):
+    mol = get_mol
+    def mp2(mol):
+        mf = scf.RHF(mol)
+        mf.kernel()
+        mymp = mp.MP2(mf)
+        # one shell per block of the AO integrals
+        mymp.max_memory = 1
+        mymp.kernel(with_t2=False)
+        return mymp.e_tot
+    g = jax.grad(mp2)(mol).coords
+    g0 = numpy.asarray([[0, 0, 9.49104413e-02],
+                        [0, 3.79148621e-02, -4.74552207e-02],
+                        [0, -3.79148621e-02, -4.74552207e-02]])
+    assert abs(g-g0).max() < 2e-6
+
+def test_energy_grad(get_mol):
+    mol = get_mol
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mymp = mp.MP2(mf)
+    mymp.kernel()
+    g = mymp.energy_grad().coords
+    g0 = numpy.asarray([[0, 0, 9.49104413e-02],
+                        [0, 3.79148621e-02, -4.74552207e-02],
+                        [0, -3.79148621e-02, -4.74552207e-02]])
+    assert abs(g-g0).max() < 2e-6
+
+def test_df(get_mol0, get_mol):
+    mf = scf.RHF(get_mol)
+    mf.kernel()
+    mf.with_df = pyscf_df.DF(get_mol, auxbasis='weigend')
+    mymp = mp.MP2(mf)
+    e_corr = mymp.kernel(with_t2=False)[0]
+
+    mf0 = pyscf.scf.RHF(get_mol0).run()
+    mymp0 = dfmp2.DFMP2(mf0)
+    mymp0.with_df = pyscf_df.DF(get_mol0, auxbasis='weigend')
+    assert abs(e_corr - mymp0.kernel()[0]) < 1e-8
+
+def test_energy_grad_keeps_scf(get_mol):
+    mf = scf.RHF(get_mol)
+    mf.kernel()
+    eri = mf._eri
+    assert eri is not None
+    mymp = mp.MP2(mf)
+    mymp.kernel()
+    mymp.energy_grad()
+    # the SCF object of the caller is left untouched
+    assert mf._eri is eri
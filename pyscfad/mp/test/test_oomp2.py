@@ -0,0 +1,81 @@
+import pytest
+import numpy
+import jax
+from pyscfad import gto, scf, mp
+from pyscfad.mp import oomp2
+from pyscfad.scf import newton
+
+def _mol(coords=None):
+    mol = gto.Mole()
+    mol.atom = 'O 0. 0. 0.; H 0. , -0.757 , 0.587; H 0. , 0.757 , 0.587'
+    if coords is not None:
+        mol.atom = [['O', coords[0]], ['H', coords[1]], ['H', coords[2]]]
+        mol.unit = 'Bohr'
+    mol.basis = 'sto3g'
+    mol.verbose=0
+    mol.build()
+    return mol
+
+@pytest.fixture
+def get_mol():
+    return _mol()
+
+def _oomp2(mol):
+    mf = scf.RHF(mol)
+    mf.kernel()
+    mymp = mp.OOMP2(mf)
+    mymp.conv_tol = 1e-12
+    mymp.kernel()
+    return mymp
+
+# pylint: disable=redefined-outer-name
+def test_energy(get_mol):
+    mol = get_mol
+    mf = scf.RHF(mol)
+    mf.kernel()
+    e_mp2 = mp.MP2(mf).kernel()[0]
+
+    mymp = mp.OOMP2(mf)
+    mymp.conv_tol = 1e-12
+    e_corr, t2 = mymp.kernel()
+    assert mymp.converged
+    # the MP2 energy is the first point of the minimization
+    assert mymp.e_tot < mf.e_tot + e_mp2
+
+    # stationary wrt the orbital rotations
+    energy = oomp2.gen_energy(mf, mf.mo_occ)
+    nrot = len(newton.get_rotation_index(mf.mo_occ))
+    g = jax.grad(energy, argnums=1)(mymp.mo_coeff, numpy.zeros(nrot))
+    assert abs(g).max() < 1e-5
+
+    # the same minimum from the optimized orbitals
+    e_corr1 = mymp.kernel(mo_coeff=mymp.mo_coeff)[0]
+    assert abs(e_corr1 - e_corr) < 1e-10
+
+    # t2 in the optimized orbitals reproduces the correlation energy
+    nocc = mymp.nocc
+    co = mymp.mo_coeff[:,:nocc]
+    cv = mymp.mo_coeff[:,nocc:]
+    ovov = mol.intor('int2e', aosym='s1')
+    ovov = numpy.einsum('pqrs,pi,qa,rj,sb->iajb', ovov, co, cv, co, cv)
+    e = (2*numpy.einsum('ijab,iajb', t2, ovov)
+         - numpy.einsum('ijab,ibja', t2, ovov))
+    assert abs(e - e_corr) < 1e-8
+
+def test_energy_grad(get_mol):
+    mymp = _oomp2(get_mol)
+    mf = mymp._scf
+    eri = mf._eri
+    g = mymp.energy_grad().coords
+    # the SCF object of the caller is left untouched
+    assert mf._eri is eri
+
+    coords = numpy.asarray(get_mol.atom_coords())
+    disp = 1e-4
+    for ia, x in ((0, 2), (1, 1), (2, 2)):
+        cp = coords.copy()
+        cp[ia,x] += disp
+        ep = _oomp2(_mol(cp)).e_tot
+        cp[ia,x] -= 2*disp
+        em = _oomp2(_mol(cp)).e_tot
+        assert abs(g[ia,x] - (ep - em) / (2*disp)) < 1e-6
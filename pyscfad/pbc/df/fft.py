@@ -1,14 +1,19 @@
 from typing import Optional, Any
+from collections import OrderedDict
 import numpy
 from pyscf import __config__
 from pyscf import lib as pyscf_lib
-from pyscf.pbc.lib.kpts_helper import gamma_point
+from pyscf.pbc.lib.kpts_helper import is_zero, gamma_point
+from pyscf.pbc.tools import get_coulG
 from pyscf.pbc.df import fft as pyscf_fft
 from pyscfad import lib
 from pyscfad.lib import numpy as jnp
-from pyscfad.pbc import tools 
+from pyscfad.lib import stop_grad
+from pyscfad.pbc import tools
 from pyscfad.pbc.gto import Cell
 
+COULG_CACHE_SIZE = getattr(__config__, 'pbc_df_fft_coulG_cache_size', 64)
+
 def get_pp(mydf, kpts=None, cell=None):
     '''Get the periodic pseudotential nuc-el AO matrix, with G=0 removed.
     '''
@@ -133,6 +138,8 @@ class FFTDF(pyscf_fft.FFTDF):
     #_numint: numint.KNumInt = numint.KNumInt()
     _numint: Any = None # can't import numint here
     _rsh_df: dict = lib.field(default_factory = dict)
+    # q -> (coulG, exp(-iqr)), see get_coulG_expmikr
+    _coulG_cache: OrderedDict = lib.field(default_factory=OrderedDict, signature=False)
 
     def __post_init__(self):
         from pyscf.pbc.dft import gen_grid
@@ -176,5 +183,43 @@ class FFTDF(pyscf_fft.FFTDF):
                 vj = fft_jk.get_j_kpts(self, dm, hermi, kpts, kpts_band, cell=cell)
         return vj, vk
 
+    def get_coulG_expmikr(self, q=numpy.zeros(3), exxdiv=False, mesh=None, cell=None):
+        '''Coulomb kernel and phase factor exp(-iqr) on the uniform grids
+        for the momentum transfer q.
+
+        The results are cached by (lattice, dimension, omega, mesh, q, exxdiv),
+        and the cache holds at most COULG_CACHE_SIZE entries within 10% of
+        max_memory.
+        '''
+        if cell is None:
+            cell = self.cell
+        if mesh is None:
+            mesh = self.mesh
+        q = numpy.asarray(q)
+        a = numpy.asarray(stop_grad(cell.lattice_vectors()))
+        key = (numpy.round(a, 9).tobytes(), cell.dimension,
+               getattr(cell, 'low_dim_ft_type', None),
+               float(getattr(cell, 'omega', 0)), tuple(mesh),
+               tuple(numpy.round(q, 9)), str(exxdiv))
+        # pylint: disable=no-member, unsupported-membership-test
+        # pylint: disable=unsubscriptable-object, unsupported-assignment-operation
+        if key in self._coulG_cache:
+            self._coulG_cache.move_to_end(key)
+            return self._coulG_cache[key]
+
+        coulG = get_coulG(cell, q, exxdiv, self, mesh)
+        if is_zero(q):
+            expmikr = numpy.array(1.)
+        else:
+            coords = cell.gen_uniform_grids(mesh)
+            expmikr = numpy.exp(-1j * numpy.dot(coords, q))
+
+        ngrids = numpy.prod(mesh)
+        max_size = min(COULG_CACHE_SIZE, int(self.max_memory*.1e6/24/ngrids))
+        if max_size > 0:
+            self._coulG_cache[key] = (coulG, expmikr)
+            while len(self._coulG_cache) > max_size:
+                self._coulG_cache.popitem(last=False)
+        return coulG, expmikr
 
     get_pp = get_pp
@@ -1,9 +1,8 @@
 import numpy
 from pyscf import lib as pyscf_lib
 from pyscf.lib import logger
-from pyscf.pbc.tools import get_coulG
 from pyscf.pbc.df.df_jk import _format_dms, _format_kpts_band, _format_jks
-from pyscf.pbc.lib.kpts_helper import is_zero, gamma_point
+from pyscf.pbc.lib.kpts_helper import gamma_point
 from pyscfad.lib import numpy as jnp
 from pyscfad.lib import ops
 from pyscfad.pbc import tools
@@ -20,7 +19,7 @@ def get_j_kpts(mydf, dm_kpts, hermi=1, kpts=numpy.zeros((1,3)), kpts_band=None,
     dms = _format_dms(dm_kpts, kpts)
     nset, nkpts, nao = dms.shape[:3]
 
-    coulG = get_coulG(cell, mesh=mesh)
+    coulG = mydf.get_coulG_expmikr(numpy.zeros(3), False, mesh, cell)[0]
     ngrids = len(coulG)
 
     if hermi == 1 or gamma_point(kpts):
@@ -84,7 +83,7 @@ def get_k_kpts(mydf, dm_kpts, hermi=1, kpts=numpy.zeros((1,3)), kpts_band=None,
     if cell is None:
         cell = mydf.cell
     mesh = mydf.mesh
-    coords = cell.gen_uniform_grids(mesh)
+    coords = mydf.grids.coords
     ngrids = coords.shape[0]
 
     if getattr(dm_kpts, 'mo_coeff', None) is not None:
@@ -108,7 +107,6 @@ def get_k_kpts(mydf, dm_kpts, hermi=1, kpts=numpy.zeros((1,3)), kpts_band=None,
     else:
         vk_kpts = jnp.zeros((nset,nband,nao,nao), dtype=jnp.complex128)
 
-    coords = mydf.grids.coords
     ao2_kpts = [jnp.asarray(ao.T)
                 for ao in mydf._numint.eval_ao(cell, coords, kpts=kpts)]
     if input_band is None:
@@ -121,63 +119,85 @@ def get_k_kpts(mydf, dm_kpts, hermi=1, kpts=numpy.zeros((1,3)), kpts_band=None,
                     for k, occ in enumerate(mo_occ)]
         ao2_kpts = [jnp.dot(mo_coeff[k].T, ao) for k, ao in enumerate(ao2_kpts)]
 
+    # pad the ket orbitals to a common size, so that the pairs can be batched
+    naoj = max(ao.shape[0] for ao in ao2_kpts)
+    ao2_kpts = [jnp.pad(ao, ((0,naoj-ao.shape[0]),(0,0))) for ao in ao2_kpts]
+    if mo_coeff is None or nset > 1:
+        ao_dms = [[jnp.dot(dms[i,k2], ao2T.conj()) for i in range(nset)]
+                  for k2, ao2T in enumerate(ao2_kpts)]
+    else:
+        ao_dms = [[ao2T.conj()] for ao2T in ao2_kpts]
+
+    # group the (k1,k2) pairs by the momentum transfer q = k2 - k1,
+    # which determines coulG and exp(-iqr)
+    qgroups = {}
+    for k2 in range(nkpts if naoj > 0 else 0):
+        for k1 in range(nband):
+            q = kpts[k2] - kpts_band[k1]
+            qgroups.setdefault(tuple(numpy.round(q, 9)), []).append((k1, k2))
+
     mem_now = pyscf_lib.current_memory()[0]
     max_memory = mydf.max_memory - mem_now
-    blksize = int(min(nao, max(1, (max_memory-mem_now)*1e6/16/4/ngrids/nao)))
-    logger.debug1(mydf, 'fft_jk: get_k_kpts max_memory %s  blksize %d',
-                  max_memory, blksize)
-    #ao1_dtype = np.result_type(*ao1_kpts)
-    #ao2_dtype = np.result_type(*ao2_kpts)
-    vR_dm = jnp.empty((nset,nao,ngrids), dtype=vk_kpts.dtype)
+    npair_max = max([len(pairs) for pairs in qgroups.values()] + [1])
+    # half of the memory for the stacked ao1T, ao2T, dm_ao and vR_dm of
+    # a chunk of pairs, and the other half for rho1, vG and vR of an AO block
+    pblksize = int(min(npair_max, max(1, max_memory*.5e6/16/ngrids/(1+nset)
+                                      /(nao+max(naoj,1)))))
+    blksize = int(min(nao, max(1, max_memory*.5e6/16/4/ngrids/max(naoj,1)/pblksize)))
+    logger.debug1(mydf, 'fft_jk: get_k_kpts max_memory %s  pblksize %d  blksize %d',
+                  max_memory, pblksize, blksize)
+    real = vk_kpts.dtype == jnp.double
 
     t1 = (logger.process_clock(), logger.perf_counter())
-    for k2, ao2T in enumerate(ao2_kpts):
-        if ao2T.size == 0:
-            continue
-
-        kpt2 = kpts[k2]
-        naoj = ao2T.shape[0]
-        if mo_coeff is None or nset > 1:
-            ao_dms = [jnp.dot(dms[i,k2], ao2T.conj()) for i in range(nset)]
+    vk_list = [[0] * nband for i in range(nset)]
+    for q, qpairs in qgroups.items():
+        q = numpy.asarray(q)
+        # If we have an ewald exxdiv, we add the G=0 correction near the
+        # end of the function to bypass any discretization errors
+        # that arise from the FFT.
+        if exxdiv == 'ewald' or exxdiv is None:
+            coulG, expmikr = mydf.get_coulG_expmikr(q, False, mesh, cell)
         else:
-            ao_dms = [ao2T.conj()]
-
-        for k1, ao1T in enumerate(ao1_kpts):
-            kpt1 = kpts_band[k1]
-
-            # If we have an ewald exxdiv, we add the G=0 correction near the
-            # end of the function to bypass any discretization errors
-            # that arise from the FFT.
-            if exxdiv == 'ewald' or exxdiv is None:
-                coulG = get_coulG(cell, kpt2-kpt1, False, mydf, mesh)
-            else:
-                coulG = get_coulG(cell, kpt2-kpt1, exxdiv, mydf, mesh)
-            if is_zero(kpt1-kpt2):
-                expmikr = numpy.array(1.)
-            else:
-                expmikr = numpy.exp(-1j * numpy.dot(coords, kpt2-kpt1))
-
+            coulG, expmikr = mydf.get_coulG_expmikr(q, exxdiv, mesh, cell)
+
+        for c0, c1 in pyscf_lib.prange(0, len(qpairs), pblksize):
+            pairs = qpairs[c0:c1]
+            k1s = [k1 for k1, k2 in pairs]
+            k2s = [k2 for k1, k2 in pairs]
+            npair = len(pairs)
+            ao1T = jnp.asarray([ao1_kpts[k1] for k1 in k1s])
+            ao2T = jnp.asarray([ao2_kpts[k2] for k2 in k2s])
+            dm_ao = [jnp.asarray([ao_dms[k2][i] for k2 in k2s]) for i in range(nset)]
+
+            # (npair, nset, nao, ngrids), assembled from the AO blocks
+            vR_dm = [[] for i in range(nset)]
             for p0, p1 in pyscf_lib.prange(0, nao, blksize):
-                rho1 = jnp.einsum('ig,jg->ijg', ao1T[p0:p1].conj()*expmikr, ao2T)
+                rho1 = jnp.einsum('pig,pjg->pijg', ao1T[:,p0:p1].conj()*expmikr, ao2T)
+                # one batched FFT over the pairs and the AO block
                 vG = tools.fft(rho1.reshape(-1,ngrids), mesh)
                 rho1 = None
                 vG *= coulG
-                vR = tools.ifft(vG, mesh).reshape(p1-p0,naoj,ngrids)
+                vR = tools.ifft(vG, mesh).reshape(npair,p1-p0,naoj,ngrids)
                 vG = None
-                if vR_dm.dtype == jnp.double:
+                if real:
                     vR = vR.real
                 for i in range(nset):
-                    #np.einsum('ijg,jg->ig', vR, ao_dms[i], out=vR_dm[i,p0:p1])
-                    vR_dm = ops.index_update(vR_dm, ops.index[i,p0:p1],
-                                             jnp.einsum('ijg,jg->ig', vR, ao_dms[i]))
+                    vR_dm[i].append(jnp.einsum('pijg,pjg->pig', vR, dm_ao[i]))
                 vR = None
-            vR_dm *= expmikr.conj()
+            ao2T = dm_ao = None
 
             for i in range(nset):
-                #vk_kpts[i,k1] += weight * lib.dot(vR_dm[i], ao1T.T)
-                vk_kpts = ops.index_add(vk_kpts, ops.index[i,k1],
-                                        weight * jnp.dot(vR_dm[i], ao1T.T))
-        t1 = logger.timer_debug1(mydf, 'get_k_kpts: make_kpt (%d,*)'%k2, *t1)
+                vR_dm_i = jnp.concatenate(vR_dm[i], axis=1) * expmikr.conj()
+                vR_dm[i] = None
+                vk = weight * jnp.einsum('pig,pjg->pij', vR_dm_i, ao1T)
+                for n, k1 in enumerate(k1s):
+                    vk_list[i][k1] += vk[n]
+            ao1T = vR_dm_i = None
+            t1 = logger.timer_debug1(mydf, 'get_k_kpts: q = %s, %d pairs'
+                                     % (q, npair), *t1)
+
+    vk_kpts = jnp.asarray([[jnp.zeros((nao,nao), dtype=vk_kpts.dtype) + vk
+                            for vk in vk_list[i]] for i in range(nset)])
 
     # Function _ewald_exxdiv_for_G0 to add back in the G=0 component to vk_kpts
     # Note in the _ewald_exxdiv_for_G0 implementation, the G=0 treatments are
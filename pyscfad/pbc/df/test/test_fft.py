@@ -84,3 +84,40 @@ def test_get_pp(get_cell, get_cell_ref, get_cell_ref_p, get_cell_ref_m):
     g_z = (vpp_ref_p - vpp_ref_m) / (0.0002/BOHR)
     jac_fwd = jax.jacfwd(mydf.__class__.get_pp)(mydf, kpts=kpts)
     assert abs(jac_fwd.cell.coords[...,1,2] - g_z).max() < 1e-6
+
+def test_get_k_kpts(get_cell, get_cell_ref):
+    cell = get_cell
+    kpts = cell.make_kpts([3,1,1])
+    nao = cell.nao
+    numpy.random.seed(1)
+    dm = numpy.random.random((len(kpts),nao,nao))
+    dm = dm + dm.transpose(0,2,1)
+    mydf = fft.FFTDF(cell, kpts=kpts)
+    vk = mydf.get_jk(dm, kpts=kpts, with_j=False)[1]
+
+    mydf_ref = pyscf_fft.FFTDF(get_cell_ref, kpts=kpts)
+    vk_ref = mydf_ref.get_jk(dm, kpts=kpts, with_j=False)[1]
+    assert abs(vk-vk_ref).max() < 1e-10
+
+    # 5 momentum transfers k2-k1 on the 3x1x1 mesh
+    assert len(mydf._coulG_cache) == 5
+    vk1 = mydf.get_jk(dm, kpts=kpts, with_j=False)[1]
+    assert len(mydf._coulG_cache) == 5
+    assert abs(vk1-vk).max() < 1e-12
+
+def test_coulG_cache(get_cell, get_cell_ref):
+    from pyscf.pbc.tools import get_coulG
+    mydf = fft.FFTDF(get_cell)
+    # the cache does not enter the static signature of the pytree
+    treedef = jax.tree_util.tree_structure(mydf)
+    coulG = mydf.get_coulG_expmikr()[0]
+    assert mydf.get_coulG_expmikr()[0] is coulG
+    assert jax.tree_util.tree_structure(mydf) == treedef
+
+    # the range separation parameter is part of the key
+    cell = get_cell_ref
+    coulG0 = mydf.get_coulG_expmikr(cell=cell)[0]
+    cell.omega = 0.3
+    coulG1 = mydf.get_coulG_expmikr(cell=cell)[0]
+    assert abs(coulG1 - get_coulG(cell, mesh=mydf.mesh)).max() < 1e-12
+    assert abs(coulG1 - coulG0).max() > 1e-3
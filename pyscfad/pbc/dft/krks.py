@@ -41,8 +41,18 @@ def get_veff(ks, cell=None, dm=None, dm_last=0, vhf_last=0, hermi=1,
             ks.grids = rks.prune_small_rho_grids_(ks, stop_grad(cell), stop_grad(dm), ks.grids, kpts)
         t0 = logger.timer(ks, 'setting up grids', *t0)
 
+    sym = None
+    if ground_state and getattr(ks, 'time_reversal_symmetry', False):
+        sym = ks.ibz_map(kpts)
     if hermi == 2:  # because rho = 0
         n, exc, vxc = 0, 0, 0
+    elif sym is not None:
+        # Vxc on the irreducible k-points only
+        ibz, bz2ibz, conj = sym
+        dm = khf.expand_kmat(dm[ibz], bz2ibz, conj)
+        n, exc, vxc = ks._numint.nr_rks(cell, ks.grids, ks.xc, dm, 0,
+                                        kpts, numpy.asarray(kpts)[ibz])
+        vxc = khf.expand_kmat(vxc, bz2ibz, conj)
     else:
         n, exc, vxc = ks._numint.nr_rks(cell, ks.grids, ks.xc, dm, 0,
                                         kpts, kpts_band)
@@ -1,6 +1,7 @@
 import sys
 import numpy
 from pyscf import __config__
+from pyscf.lib import logger
 from pyscf.pbc.scf import khf as pyscf_khf
 from pyscfad import lib
 from pyscfad.lib import numpy as jnp
@@ -22,11 +23,55 @@ def get_hcore(mf, cell=None, kpts=None):
     t = jnp.asarray(cell.pbc_intor('int1e_kin', 1, 1, kpts))
     return nuc + t
 
+def time_reversal_map(cell, kpts, tol=1e-6):
+    '''
+    Irreducible k-points under time-reversal symmetry, k ~ -k.
+
+    Returns:
+        ibz : indices of the irreducible k-points in kpts
+        bz2ibz : for each k-point, its position in ibz
+        conj : whether the k-point is mapped to -k of its irreducible k-point
+    '''
+    nk = len(kpts)
+    ngrid = int(round(1./tol))
+    # fractional coordinates on a grid of spacing tol, modulo the
+    # reciprocal lattice vectors
+    keys = numpy.rint(cell.get_scaled_kpts(kpts) * ngrid).astype(numpy.int64) % ngrid
+
+    ibz = []
+    bz2ibz = numpy.empty(nk, dtype=int)
+    conj = numpy.zeros(nk, dtype=bool)
+    seen = {}
+    for k, key in enumerate(keys):
+        mkey = tuple(-key % ngrid)
+        key = tuple(key)
+        if key in seen:
+            bz2ibz[k] = seen[key]
+        elif mkey in seen:
+            bz2ibz[k] = seen[mkey]
+            conj[k] = True
+        else:
+            seen[key] = bz2ibz[k] = len(ibz)
+            ibz.append(k)
+    return numpy.asarray(ibz), bz2ibz, conj
+
+def expand_kmat(mat_ibz, bz2ibz, conj):
+    '''
+    Matrices on all k-points from those on the irreducible k-points,
+    using M(-k) = M(k)^*.
+    '''
+    mat = jnp.asarray(mat_ibz)[bz2ibz]
+    if not conj.any():
+        return mat
+    return jnp.where(conj.reshape((-1,)+(1,)*(mat.ndim-1)), mat.conj(), mat)
+
 
 @lib.dataclass
 class KSCF(pbchf.SCF, pyscf_khf.KSCF):
     kpts: numpy.ndarray = numpy.zeros((1,3))
     exx_built: bool = False
+    # only compute the irreducible k-points under time reversal
+    time_reversal_symmetry: bool = False
 
     def __init__(self, cell, **kwargs):
         if not cell._built:
@@ -44,7 +89,48 @@ class KSCF(pbchf.SCF, pyscf_khf.KSCF):
         if self.with_df is None:
             self.with_df = df.FFTDF(self.cell)
 
-        self._keys = self._keys.union(['cell', 'exx_built', 'exxdiv', 'with_df', 'rsjk'])
+        self._keys = self._keys.union(['cell', 'exx_built', 'exxdiv', 'with_df', 'rsjk',
+                                       'time_reversal_symmetry'])
+
+    def dump_flags(self, verbose=None):
+        pyscf_khf.KSCF.dump_flags(self, verbose)
+        sym = self.ibz_map()
+        if sym is not None:
+            logger.info(self, 'time-reversal symmetry: %d irreducible k-points',
+                        len(sym[0]))
+        return self
+
+    def ibz_map(self, kpts=None):
+        '''
+        The time-reversal map (ibz, bz2ibz, conj) of kpts,
+        or None if the symmetry is not used.
+        '''
+        if not self.time_reversal_symmetry:
+            return None
+        if kpts is None: kpts = self.kpts
+        kpts = numpy.asarray(kpts)
+        if kpts.ndim != 2:
+            return None
+        sym = time_reversal_map(self.cell, kpts)
+        if len(sym[0]) == len(kpts):
+            return None
+        return sym
+
+    def get_hcore(self, cell=None, kpts=None):
+        if kpts is None: kpts = self.kpts
+        sym = self.ibz_map(kpts)
+        if sym is None:
+            return get_hcore(self, cell, kpts)
+        ibz, bz2ibz, conj = sym
+        return expand_kmat(get_hcore(self, cell, kpts[ibz]), bz2ibz, conj)
+
+    def get_ovlp(self, cell=None, kpts=None):
+        if kpts is None: kpts = self.kpts
+        sym = self.ibz_map(kpts)
+        if sym is None:
+            return pyscf_khf.KSCF.get_ovlp(self, cell, kpts)
+        ibz, bz2ibz, conj = sym
+        return expand_kmat(pyscf_khf.KSCF.get_ovlp(self, cell, kpts[ibz]), bz2ibz, conj)
 
     def get_jk(self, cell=None, dm_kpts=None, hermi=1, kpts=None, kpts_band=None,
                with_j=True, with_k=True, omega=None, **kwargs):
@@ -52,6 +138,15 @@ class KSCF(pbchf.SCF, pyscf_khf.KSCF):
         if kpts is None: kpts = self.kpts
         if dm_kpts is None: dm_kpts = self.make_rdm1()
         #cpu0 = (logger.process_clock(), logger.perf_counter())
+        sym = None
+        if kpts_band is None and getattr(dm_kpts, 'ndim', 0) == 3:
+            sym = self.ibz_map(kpts)
+        if sym is not None:
+            # symmetrize the density matrices, and build J/K only
+            # on the irreducible k-points
+            ibz, bz2ibz, conj = sym
+            dm_kpts = expand_kmat(dm_kpts[ibz], bz2ibz, conj)
+            kpts_band = numpy.asarray(kpts)[ibz]
         if self.rsjk:
             raise NotImplementedError
             #vj, vk = self.rsjk.get_jk(dm_kpts, hermi, kpts, kpts_band,
@@ -59,12 +154,29 @@ class KSCF(pbchf.SCF, pyscf_khf.KSCF):
         else:
             vj, vk = self.with_df.get_jk(dm_kpts, hermi, kpts, kpts_band,
                                          with_j, with_k, omega, self.exxdiv, cell=cell)
+        if sym is not None:
+            if vj is not None:
+                vj = expand_kmat(vj, bz2ibz, conj)
+            if vk is not None:
+                vk = expand_kmat(vk, bz2ibz, conj)
         #logger.timer(self, 'vj and vk', *cpu0)
         return vj, vk
 
+    def eig(self, h_kpts, s_kpts):
+        sym = None
+        if len(h_kpts) == len(self.kpts):
+            sym = self.ibz_map()
+        if sym is None:
+            return pyscf_khf.KSCF.eig(self, h_kpts, s_kpts)
+        ibz, bz2ibz, conj = sym
+        e_ibz, c_ibz = pyscf_khf.KSCF.eig(self, [h_kpts[k] for k in ibz],
+                                          [s_kpts[k] for k in ibz])
+        mo_energy = [e_ibz[n] for n in bz2ibz]
+        mo_coeff = [c_ibz[n].conj() if cj else c_ibz[n]
+                    for n, cj in zip(bz2ibz, conj)]
+        return mo_energy, mo_coeff
+
     get_init_guess = pyscf_khf.KSCF.get_init_guess
-    get_hcore = get_hcore
-    get_ovlp = pyscf_khf.KSCF.get_ovlp
     get_fock = pyscf_khf.KSCF.get_fock
     get_occ = pyscf_khf.KSCF.get_occ
     energy_elec = pyscf_khf.KSCF.energy_elec
@@ -75,6 +187,5 @@ class KSCF(pbchf.SCF, pyscf_khf.KSCF):
     get_k = pyscf_khf.KSCF.get_k
     get_grad = pyscf_khf.KSCF.get_grad
     make_rdm1 = pyscf_khf.KSCF.make_rdm1
-    eig = pyscf_khf.KSCF.eig
 
 KRHF = KSCF
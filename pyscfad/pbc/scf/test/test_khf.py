@@ -131,3 +131,19 @@ def test_e_tot(get_cell, get_cell_ref):
     assert abs(e_tot - e_tot_ref) < 1e-10
     assert abs(jac_fwd.coords - g0).max() < 1e-8
     assert abs(jac_bwd.coords - g0).max() < 1e-8
+
+def test_e_tot_time_reversal(get_cell, get_cell_ref):
+    cell = get_cell
+    kpts = cell.make_kpts([3,1,1])
+    mf = scf.KRHF(cell, kpts=kpts, exxdiv=None, time_reversal_symmetry=True)
+    assert len(mf.ibz_map()[0]) == 2
+    e_tot = mf.kernel()
+    jac_bwd = mf.energy_grad(mode='rev')
+
+    cell_ref = get_cell_ref
+    mf_ref = pyscf_scf.KRHF(cell_ref, kpts=kpts, exxdiv=None)
+    e_tot_ref = mf_ref.kernel()
+    g0 = pyscf_grad.krhf.Gradients(mf_ref).kernel()
+
+    assert abs(e_tot - e_tot_ref) < 1e-10
+    assert abs(jac_bwd.coords - g0).max() < 1e-8
@@ -1,16 +1,22 @@
 from functools import partial
 import tempfile
 from typing import Optional, Any
+import numpy
 import jax
 from pyscf import __config__
-from pyscf.lib import param
+from pyscf.lib import param, prange
 from pyscf.scf import hf, diis
 from pyscf.scf.hf import MUTE_CHKFILE
 from pyscfad import lib, gto
+from pyscfad.gto import moleintor
 from pyscfad.lib import numpy as jnp
 from pyscfad.lib import stop_grad
 from . import _vhf
 
+# fall back to the dense contraction if more than this fraction
+# of the AO pairs survive the screening
+SCREENING_MAX_RATIO = getattr(__config__, 'scf_hf_screening_max_ratio', .5)
+
 def dot_eri_dm(eri, dm, hermi=0, with_j=True, with_k=True):
     dm = jnp.asarray(dm)
     nao = dm.shape[-1]
@@ -36,6 +42,86 @@ def _dot_eri_dm_nosymm(eri, dm, with_j, with_k):
         vk = vk.reshape(dm.shape)
     return vj, vk
 
+def dot_eri_dm_screened(eri, dm, hermi=0, with_j=True, with_k=True,
+                        direct_scf_tol=1e-13, max_memory=param.MAX_MEMORY):
+    '''
+    Same as :func:`dot_eri_dm`, but the AO pairs with the density weighted
+    Schwarz bounds below ``direct_scf_tol`` are skipped in the contraction.
+    This is most effective for the difference density in the late SCF cycles.
+    The screening needs concrete values. Under AD (e.g., ``grad`` or ``jvp``)
+    the primal values are known, and the screened contraction is
+    differentiated by its custom JVP; abstract inputs (e.g., under
+    ``jit`` or ``vmap``) fall back to the dense contraction.
+    '''
+    dm = jnp.asarray(dm)
+    nao = dm.shape[-1]
+    if eri.size != nao**4 or not (_is_concrete(dm) and _is_concrete(eri)):
+        return dot_eri_dm(eri, dm, hermi, with_j, with_k)
+    eri = eri.reshape((nao,)*4)
+    return _dot_eri_dm_screened(eri, dm, with_j, with_k, direct_scf_tol, max_memory)
+
+def _is_concrete(x):
+    # e.g., the JVP tracers of concrete arrays
+    return (not isinstance(x, jax.core.Tracer) or
+            isinstance(x.aval, jax.core.ConcreteArray))
+
+@partial(jax.custom_jvp, nondiff_argnums=(2,3,4,5))
+def _dot_eri_dm_screened(eri, dm, with_j, with_k, direct_scf_tol, max_memory):
+    nao = dm.shape[-1]
+    dms = dm.reshape(-1,nao,nao)
+    npair_max = SCREENING_MAX_RATIO * nao**2
+    # the gathered (p|kl) blocks
+    blksize = int(max(1, max_memory*1e6/8/nao**2))
+    q = numpy.sqrt(abs(numpy.asarray(jnp.einsum('ijij->ij', eri))))
+    dm_max = abs(numpy.asarray(dms)).max(axis=0)
+
+    vj = vk = None
+    if with_j:
+        # |(ij|kl) D_ji| <= q_ij q_kl |D_ji|
+        i, j = numpy.where(q * dm_max.T * q.max() > direct_scf_tol)
+        if i.size > npair_max:
+            vj = jnp.einsum('ijkl,xji->xkl', eri, dms)
+        else:
+            vj = 0
+            for p0, p1 in prange(0, i.size, blksize):
+                ib, jb = i[p0:p1], j[p0:p1]
+                vj += jnp.einsum('pkl,xp->xkl', eri[ib,jb], dms[:,jb,ib])
+            vj = jnp.zeros_like(dms) + vj
+        vj = vj.reshape(dm.shape)
+    if with_k:
+        # |(ij|kl) D_jk| <= max_i(q_ij) max_l(q_kl) |D_jk|
+        q_max = q.max(axis=0)
+        j, k = numpy.where(dm_max * q_max[:,None] * q_max > direct_scf_tol)
+        if j.size > npair_max:
+            vk = jnp.einsum('ijkl,xjk->xil', eri, dms)
+        else:
+            vk = 0
+            for p0, p1 in prange(0, j.size, blksize):
+                jb, kb = j[p0:p1], k[p0:p1]
+                vk += jnp.einsum('ipl,xp->xil', eri[:,jb,kb], dms[:,jb,kb])
+            vk = jnp.zeros_like(dms) + vk
+        vk = vk.reshape(dm.shape)
+    return vj, vk
+
+@_dot_eri_dm_screened.defjvp
+def _dot_eri_dm_screened_jvp(with_j, with_k, direct_scf_tol, max_memory,
+                             primals, tangents):
+    eri, dm = primals
+    eri_t, dm_t = tangents
+    primal_out = _dot_eri_dm_screened(eri, dm, with_j, with_k, direct_scf_tol,
+                                      max_memory)
+
+    # NOTE the screening is based on the primal density,
+    # so the tangents are computed without screening
+    vj_t0, vk_t0 = _dot_eri_dm_nosymm(eri_t, dm, with_j, with_k)
+    vj_t1, vk_t1 = _dot_eri_dm_nosymm(eri, dm_t, with_j, with_k)
+    vj_t = vk_t = None
+    if with_j:
+        vj_t = vj_t0 + vj_t1
+    if with_k:
+        vk_t = vk_t0 + vk_t1
+    return primal_out, (vj_t, vk_t)
+
 @lib.dataclass
 class SCF(hf.SCF):
     # pylint: disable=too-many-instance-attributes
@@ -76,6 +162,8 @@ class SCF(hf.SCF):
 
     opt: Any = None
     _eri: Optional[jnp.array] = None
+    # range-separated ERIs keyed by omega
+    _rsh_eri: dict = lib.field(default_factory = dict, signature=False)
     _built: bool = False
 
     def __post_init__(self):
@@ -100,11 +188,66 @@ class SCF(hf.SCF):
             mol = self.mol
         if dm is None:
             dm = self.make_rdm1()
-        if self._eri is None:
-            self._eri = self.mol.intor('int2e', aosym='s1')
-        vj, vk = dot_eri_dm(self._eri, dm, hermi, with_j, with_k)
+        if not omega:
+            if self._eri is None:
+                self._eri = self.mol.intor('int2e', aosym='s1')
+            eri = self._eri
+        else:
+            eri = self._get_rsh_eri(omega)
+        if self.direct_scf:
+            vj, vk = dot_eri_dm_screened(eri, dm, hermi, with_j, with_k,
+                                         self.direct_scf_tol, self.max_memory)
+        else:
+            vj, vk = dot_eri_dm(eri, dm, hermi, with_j, with_k)
         return vj, vk
 
+    def get_veff(self, mol=None, dm=None, dm_last=0, vhf_last=0, hermi=1):
+        if mol is None:
+            mol = self.mol
+        if dm is None:
+            dm = self.make_rdm1()
+        if self.direct_scf:
+            # incremental Fock build: the screening in get_jk
+            # gets tighter as the difference density shrinks
+            ddm = jnp.asarray(dm) - jnp.asarray(dm_last)
+            vj, vk = self.get_jk(mol, ddm, hermi)
+            return vj - vk * .5 + vhf_last
+        else:
+            vj, vk = self.get_jk(mol, dm, hermi)
+            return vj - vk * .5
+
+    def _get_rsh_eri(self, omega):
+        '''
+        Attenuated ERIs: omega > 0 for erf(omega r)/r (long-range),
+        omega < 0 for erfc(|omega| r)/r (short-range).
+        '''
+        eri = self._rsh_eri.get(omega)
+        if eri is None:
+            # NOTE the derivative integrals in the JVP are evaluated
+            # within the same context, so that they are also attenuated
+            with self.mol.with_range_coulomb(omega):
+                eri = self.mol.intor('int2e', aosym='s1')
+            # NOTE the dict is shared by the copies of the object made by
+            # the jax transforms, so it is rebound instead of updated,
+            # and traced integrals are never cached
+            if not isinstance(eri, jax.core.Tracer):
+                self._rsh_eri = {**self._rsh_eri, omega: eri}
+        return eri
+
+    def _eri_primal_cache(self):
+        cache = {}
+        if self._eri is not None:
+            cache[moleintor.cache_key(self.mol, 'int2e')] = self._eri
+        for omega, eri in self._rsh_eri.items():
+            with self.mol.with_range_coulomb(omega):
+                cache[moleintor.cache_key(self.mol, 'int2e')] = eri
+        return cache
+
+    def reset(self, mol=None):
+        hf.SCF.reset(self, mol)
+        self._rsh_eri = {}
+        return self
+
     def get_init_guess(self, mol=None, key='minao'):
         if mol is None:
             mol = self.mol
@@ -131,14 +274,19 @@ class SCF(hf.SCF):
             func = e_tot
             if dm0 is None:
                 dm0 = self.make_rdm1()
+            # the cached ERIs are reused as the primal output,
+            # so that only the derivative integrals are computed
+            eri_cache = self._eri_primal_cache()
             self.reset() # need to reset _eri to get its gradient
         else:
             func = self.__class__.kernel
+            eri_cache = {}
 
-        if mode == "rev":
-            jac = jax.jacrev(func)(self, dm0=dm0)
-        else:
-            jac = jax.jacfwd(func)(self, dm0=dm0)
+        with moleintor.primal_cache(eri_cache):
+            if mode == "rev":
+                jac = jax.jacrev(func)(self, dm0=dm0)
+            else:
+                jac = jax.jacfwd(func)(self, dm0=dm0)
         if hasattr(jac,"cell"):
             return jac.cell
         else:
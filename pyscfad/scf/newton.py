@@ -0,0 +1,193 @@
+'''
+Second order (trust-region Newton) SCF solver
+
+The orbital gradient and the orbital Hessian-vector products
+are computed by AD of the energy with respect to the
+orbital rotation parameters.
+'''
+import numpy
+import jax
+from pyscf import __config__
+from pyscf.lib import logger
+from pyscfad.lib import numpy as jnp
+from pyscfad.lib import ops
+from pyscfad.lib import stop_grad
+from pyscfad.tools import rotate_mo1
+
+MAX_CYCLE_CG = getattr(__config__, 'scf_newton_max_cycle_cg', 20)
+TRUST_RADIUS = getattr(__config__, 'scf_newton_trust_radius', .5)
+MAX_TRUST_RADIUS = getattr(__config__, 'scf_newton_max_trust_radius', 2.)
+
+def get_rotation_index(mo_occ):
+    '''
+    Positions of the non-redundant (occupied-virtual) rotations
+    in the packed upper triangle used by :func:`rotate_mo1`.
+    '''
+    nmo = len(mo_occ)
+    occ = numpy.asarray(mo_occ) > 0
+    p, q = numpy.triu_indices(nmo)
+    return numpy.where(occ[p] != occ[q])[0]
+
+def gen_energy(mf, mo_coeff, mo_occ, h1e=None):
+    '''
+    Total energy as a function of the non-redundant rotation parameters.
+    '''
+    if h1e is None:
+        h1e = mf.get_hcore()
+    nmo = mo_coeff.shape[-1]
+    ntriu = nmo * (nmo+1) // 2
+    idx = get_rotation_index(mo_occ)
+    def energy(x):
+        x = ops.index_update(jnp.zeros(ntriu, dtype=x.dtype), idx, x)
+        mo = rotate_mo1(mo_coeff, x)
+        dm = mf.make_rdm1(mo, mo_occ)
+        vhf = mf.get_veff(mf.mol, dm)
+        return mf.energy_tot(dm, h1e, vhf)
+    return energy
+
+def _to_boundary(x, p, radius):
+    # positive tau such that |x + tau * p| = radius
+    a = jnp.dot(p, p)
+    b = 2. * jnp.dot(x, p)
+    c = jnp.dot(x, x) - radius**2
+    return (-b + jnp.sqrt(b**2 - 4.*a*c)) / (2.*a)
+
+def solve_trust_region(hop, g, hdiag, radius, tol=1e-4, max_cycle=MAX_CYCLE_CG):
+    '''
+    Steihaug truncated (preconditioned) CG for the trust-region subproblem
+    min g.x + 1/2 x.H.x with |x| <= radius.
+
+    Returns:
+        x : the step
+        hx : H.x, used to evaluate the predicted energy change
+    '''
+    x = jnp.zeros_like(g)
+    hx = jnp.zeros_like(g)
+    r = -g
+    z = r / hdiag
+    p = z
+    rz = jnp.dot(r, z)
+    for _ in range(max_cycle):
+        hp = hop(p)
+        php = jnp.dot(p, hp)
+        if php <= 0 or jnp.linalg.norm(x + rz/php * p) >= radius:
+            # negative curvature or leaving the trust region
+            tau = _to_boundary(x, p, radius)
+            x += tau * p
+            hx += tau * hp
+            break
+        alpha = rz / php
+        x += alpha * p
+        hx += alpha * hp
+        r -= alpha * hp
+        if jnp.linalg.norm(r) < tol:
+            break
+        z = r / hdiag
+        rz, rz_last = jnp.dot(r, z), rz
+        p = z + rz / rz_last * p
+    return x, hx
+
+def kernel(mf, dm0=None, conv_tol=None, conv_tol_grad=None, max_cycle=None,
+           max_cycle_cg=MAX_CYCLE_CG, trust_radius=TRUST_RADIUS):
+    '''
+    Trust-region Newton SCF.
+
+    Each macro iteration linearizes the AD orbital gradient
+    at the current orbitals, so that the Hessian-vector products in the
+    CG micro iterations reuse the same trace.
+    The derivatives with respect to the SCF parameters are not traced
+    through the solver; use :meth:`SCF.energy_grad` after convergence.
+
+    Returns:
+        e_tot, with ``mf.converged``, ``mf.mo_energy``, ``mf.mo_coeff``
+        and ``mf.mo_occ`` updated.
+    '''
+    if conv_tol is None:
+        conv_tol = mf.conv_tol
+    if conv_tol_grad is None:
+        conv_tol_grad = mf.conv_tol_grad
+    if conv_tol_grad is None:
+        conv_tol_grad = numpy.sqrt(conv_tol)
+    if max_cycle is None:
+        max_cycle = mf.max_cycle
+    cput0 = (logger.process_clock(), logger.perf_counter())
+
+    mol = mf.mol
+    h1e = stop_grad(mf.get_hcore())
+    s1e = stop_grad(mf.get_ovlp())
+    if mf.mo_coeff is not None and mf.mo_occ is not None and dm0 is None:
+        mo_coeff = stop_grad(mf.mo_coeff)
+        mo_occ = mf.mo_occ
+    else:
+        if dm0 is None:
+            dm0 = mf.get_init_guess(mol, mf.init_guess)
+        dm0 = stop_grad(dm0)
+        fock = mf.get_fock(h1e, s1e, mf.get_veff(mol, dm0), dm0)
+        mo_energy, mo_coeff = mf.eig(fock, s1e)
+        mo_occ = mf.get_occ(mo_energy, mo_coeff)
+
+    e_tot = de = None
+    mf.converged = False
+    idx = get_rotation_index(mo_occ)
+    ntriu = len(mo_occ) * (len(mo_occ)+1) // 2
+    for imacro in range(max_cycle):
+        energy = gen_energy(mf, mo_coeff, mo_occ, h1e)
+        x0 = jnp.zeros(len(idx))
+        if e_tot is None:
+            e_tot = energy(x0)
+        g, hop = jax.linearize(jax.grad(energy), x0)
+        norm_g = jnp.linalg.norm(g)
+        if de is not None and abs(de) < conv_tol and norm_g < conv_tol_grad:
+            mf.converged = True
+            break
+
+        # diagonal orbital Hessian in the canonical approximation
+        dm = mf.make_rdm1(mo_coeff, mo_occ)
+        fock = mf.get_fock(h1e, s1e, mf.get_veff(mol, dm), dm)
+        fdiag = jnp.einsum('pi,pq,qi->i', mo_coeff, fock, mo_coeff)
+        p, q = numpy.triu_indices(len(mo_occ))
+        hdiag = 4. * abs(fdiag[q[idx]] - fdiag[p[idx]])
+        hdiag = jnp.where(hdiag < 1e-2, 1e-2, hdiag)
+
+        tol_cg = min(.5, numpy.sqrt(norm_g)) * norm_g
+        while True:
+            dx, hdx = solve_trust_region(hop, g, hdiag, trust_radius,
+                                         tol_cg, max_cycle_cg)
+            e_pred = jnp.dot(g, dx) + .5 * jnp.dot(dx, hdx)
+            e_trial = energy(dx)
+            de = e_trial - e_tot
+            ratio = de / e_pred if abs(e_pred) > 1e-16 else 1.
+            norm_dx = jnp.linalg.norm(dx)
+            if ratio < .25:
+                trust_radius = .25 * norm_dx
+            elif ratio > .75 and norm_dx > .9 * trust_radius:
+                trust_radius = min(2. * trust_radius, MAX_TRUST_RADIUS)
+            if ratio > 0 or trust_radius < 1e-8:
+                break
+            logger.debug(mf, 'step rejected, ratio = %.3g, trust radius = %.3g',
+                         ratio, trust_radius)
+        if ratio <= 0:
+            logger.warn(mf, 'Newton SCF stagnated, |g|= %4.3g', norm_g)
+            break
+
+        x = ops.index_update(jnp.zeros(ntriu), idx, dx)
+        mo_coeff = rotate_mo1(mo_coeff, x)
+        e_tot = e_trial
+        logger.info(mf, 'macro %d  E= %.15g  delta_E= %4.3g  |g|= %4.3g  |dx|= %4.3g',
+                    imacro+1, e_tot, de, norm_g, norm_dx)
+
+    # canonicalize the orbitals
+    dm = mf.make_rdm1(mo_coeff, mo_occ)
+    vhf = mf.get_veff(mol, dm)
+    fock = mf.get_fock(h1e, s1e, vhf, dm)
+    mo_energy, mo_coeff = mf.eig(fock, s1e)
+    mf.mo_occ = mf.get_occ(mo_energy, mo_coeff)
+    mf.mo_energy = mo_energy
+    mf.mo_coeff = mo_coeff
+    mf.e_tot = e_tot
+    logger.timer(mf, 'Newton SCF', *cput0)
+    if mf.converged:
+        logger.note(mf, 'converged Newton SCF energy = %.15g', e_tot)
+    else:
+        logger.note(mf, 'Newton SCF not converged, SCF energy = %.15g', e_tot)
+    return e_tot